@@ -573,6 +573,12 @@ class MusicTherapyBox:
         if self.music_player:
             self.music_player.stop()
             
+        if self.data_collector:
+            self.data_collector.close()
+            
+        if self.feature_extractor:
+            self.feature_extractor.close()
+            
         if self.lcd:
             self.lcd.display("System shutting down...")
             
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Shared MAX30102 access for the HR readers
+A single device handle and polling thread fan each FIFO burst out to
+every subscriber, so several readers never compete for the I2C bus
+"""
+
+import threading
+import time
+import logging
+
+from .max30102 import MAX30102
+from .ppg_window import SPSCRing
+
+try:
+    import RPi.GPIO as GPIO
+    GPIO_AVAILABLE = True
+except (ImportError, RuntimeError):
+    GPIO_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# BCM pin wired to the MAX30102 INT output (None = poll the FIFO instead)
+INT_PIN = None
+# Fallback poll interval while waiting on the INT pin (ms); longer than
+# the ~0.7 s it takes to reach the almost-full level at 25 samples/s
+INT_TIMEOUT_MS = 1000
+
+_instance = None
+_hub = None
+_lock = threading.Lock()
+
+
+def get_max30102() -> MAX30102:
+    """Return the process-wide MAX30102 instance, creating it on first use"""
+    global _instance
+    with _lock:
+        if _instance is None:
+            _instance = MAX30102()
+    return _instance
+
+
+def get_hub() -> "Hub":
+    """Return the process-wide Hub around the shared MAX30102"""
+    global _hub
+    sensor = get_max30102()
+    with _lock:
+        if _hub is None:
+            _hub = Hub(sensor)
+    return _hub
+
+
+class Hub:
+    """
+    Owns the MAX30102 polling thread.
+    Each burst read from the FIFO is pushed to every subscriber ring as a
+    (red, ir) array pair; the thread runs while at least one subscriber
+    is registered and shuts the device down when the last one leaves.
+    When an INT pin is given the thread sleeps until the sensor signals
+    new data instead of polling every LOOP_TIME.
+    """
+
+    LOOP_TIME = 0.01
+
+    def __init__(self, sensor: MAX30102, int_pin: int = INT_PIN):
+        self.sensor = sensor
+        self.last_sample_time = 0.0
+
+        # INT is open-drain, active low
+        self._int_pin = int_pin if GPIO_AVAILABLE else None
+        if self._int_pin is not None:
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self._int_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        elif int_pin is not None:
+            logger.warning("RPi.GPIO not available, polling MAX30102 FIFO instead of INT pin")
+
+        # Replaced (never mutated) so the polling thread can iterate it unlocked
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._shut_down = False
+
+    def subscribe(self, capacity: int = 64) -> SPSCRing:
+        """
+        Register a new consumer and start polling if needed
+
+        Args:
+            capacity: Number of bursts buffered for this consumer (power of two)
+
+        Returns:
+            Ring the consumer reads (red, ir) bursts from
+        """
+        ring = SPSCRing(capacity)
+        with self._lock:
+            self._subscribers = self._subscribers + (ring,)
+            if self._thread is None:
+                self._start()
+        return ring
+
+    def unsubscribe(self, ring: SPSCRing, timeout: float = 2.0):
+        """Remove a consumer; polling stops when none are left"""
+        with self._lock:
+            self._subscribers = tuple(r for r in self._subscribers if r is not ring)
+            if self._subscribers or self._thread is None:
+                return
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _start(self):
+        if self._shut_down:
+            # shutdown() overwrote the mode register
+            self.sensor.setup()
+            self._shut_down = False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Poll the FIFO and fan bursts out (runs in background thread)"""
+        logger.info("MAX30102 hub thread started")
+
+        sensor = self.sensor
+        stop_is_set = self._stop_event.is_set
+        sleep = time.sleep
+        loop_t = self.LOOP_TIME
+        int_pin = self._int_pin
+
+        while not stop_is_set():
+            try:
+                if int_pin is not None:
+                    # On timeout fall through and poll once in case an edge
+                    # was missed
+                    GPIO.wait_for_edge(int_pin, GPIO.FALLING, timeout=INT_TIMEOUT_MS)
+                    # The status flags are latched and hold INT low until
+                    # INTR_STATUS_1 is read, so clear them to re-arm the line.
+                    # Clearing before the FIFO is drained means a threshold
+                    # crossing during the drain raises a fresh edge.
+                    sensor.clear_interrupts()
+
+                num_samples = sensor.get_data_present()
+                if num_samples > 0:
+                    burst = sensor.read_fifo_burst(num_samples)
+                    self.last_sample_time = time.time()
+                    for ring in self._subscribers:
+                        ring.put_nowait(burst)
+
+                if int_pin is None:
+                    sleep(loop_t)
+
+            except Exception as e:
+                logger.error(f"Error in MAX30102 hub thread: {e}")
+                sleep(0.1)
+
+        try:
+            sensor.shutdown()
+            self._shut_down = True
+            logger.info("MAX30102 sensor shutdown")
+        except Exception as e:
+            logger.warning(f"Error shutting down sensor: {e}")
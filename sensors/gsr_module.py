@@ -93,9 +93,13 @@ class GSRSensor:
         
         while not self._stop_event.is_set():
             try:
-                if self.serial_connection and self.serial_connection.in_waiting > 0:
+                if self.serial_connection:
                     try:
+                        # Blocks in the kernel until a full line arrives or the
+                        # port timeout expires, so there is no polling delay
                         raw_data = self.serial_connection.readline()
+                        if not raw_data:
+                            continue
                         line = raw_data.decode('utf-8', errors='ignore').strip()
                         
                         # Debug: Show raw data
@@ -149,8 +153,8 @@ class GSRSensor:
                     except UnicodeDecodeError:
                         # Skip invalid data and continue
                         continue
-                
-                time.sleep(0.01)
+                else:
+                    time.sleep(0.1)
                 
             except Exception as e:
                 logger.error(f"GSR sensor error: {e}")
@@ -1,73 +1,133 @@
 
-from .max30102 import MAX30102
+from ._max30102_hub import get_hub
+from .ppg_window import PPGWindow
 from . import hrcalc
+import logging
+import queue
+from collections import deque
 import threading
 import time
+
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 
 class HeartRateMonitor(object):
     """
     A class that encapsulates the max30102 device into a thread
+
+    bpm is a plain float written only by the sensor thread; other threads
+    read it without a lock and see the last value written.
+
+    With print_raw and a raw_path the raw samples are written to that file
+    as little-endian uint32 (ir, red) pairs instead of being logged as text;
+    read them back with np.fromfile(raw_path, dtype='<u4').reshape(-1, 2).
     """
 
+    __slots__ = ("bpm", "print_raw", "print_result", "raw_path", "_thread", "_samples")
+
     LOOP_TIME = 0.01
+    VITALS_STRIDE = 10  # new samples between HR recomputations
+    RESULT_LOG_INTERVAL = 1.0  # seconds between print_result log lines
 
-    def __init__(self, print_raw=False, print_result=False):
-        self.bpm = 0
-        if print_raw is True:
+    def __init__(self, print_raw=False, print_result=False, raw_path=None):
+        self.bpm = 0.0
+        if print_raw is True and raw_path is None:
             print('IR, Red')
         self.print_raw = print_raw
+        self.raw_path = raw_path
         self.print_result = print_result
 
     def run_sensor(self):
-        sensor = MAX30102()
-        ir_data = []
-        red_data = []
-        bpms = []
+        hub = get_hub()
+        samples = self._samples
+        window = PPGWindow(100)
+        # last 4 bpm values with their running sum
+        bpms = deque(maxlen=4)
+        bpm_sum = 0.0
+        since_calc = 0
+        # phase state carried between windows by hrcalc.estimate_hr_fft
+        fft_state = {}
+        last_result_log = 0.0
+        raw_fp = None
+        if self.print_raw and self.raw_path is not None:
+            raw_fp = open(self.raw_path, 'wb', buffering=64 * 1024)
 
         # run until told to stop
         while not self._thread.stopped:
-            # check if any data is available
-            num_bytes = sensor.get_data_present()
-            if num_bytes > 0:
-                # grab all the data and stash it into arrays
-                while num_bytes > 0:
-                    red, ir = sensor.read_fifo()
-                    num_bytes -= 1
-                    ir_data.append(ir)
-                    red_data.append(red)
-                    if self.print_raw:
-                        print("{0}, {1}".format(ir, red))
-
-                while len(ir_data) > 100:
-                    ir_data.pop(0)
-                    red_data.pop(0)
-
-                if len(ir_data) == 100:
-                    bpm, valid_bpm, spo2, valid_spo2 = hrcalc.calc_hr_and_spo2(ir_data, red_data)
-                    if valid_bpm:
+            # wait for the next FIFO burst from the hub and stash it into the window
+            try:
+                burst = samples.get(timeout=self.LOOP_TIME * 50)
+            except queue.Empty:
+                continue
+            if burst is None:
+                break  # ring closed by stop_sensor
+            red_arr, ir_arr = burst
+            window.extend(red_arr, ir_arr)
+            if len(ir_arr) > 0:
+                if raw_fp is not None:
+                    pairs = np.empty((len(ir_arr), 2), dtype='<u4')
+                    pairs[:, 0] = ir_arr
+                    pairs[:, 1] = red_arr
+                    raw_fp.write(pairs.tobytes())
+                elif self.print_raw and logger.isEnabledFor(logging.DEBUG):
+                    # one log record per burst instead of one per sample
+                    logger.debug("\n".join(
+                        "%d, %d" % pair for pair in zip(ir_arr.tolist(), red_arr.tolist())))
+
+                # recompute only every VITALS_STRIDE new samples once the window is full
+                if window.is_full():
+                    since_calc += len(ir_arr)
+                    if since_calc < self.VITALS_STRIDE:
+                        continue
+                    fft_state['hop'] = since_calc
+                    since_calc = 0
+
+                    # mean < 50000 for both channels, in integer arithmetic
+                    limit = 50000 * window.filled
+                    finger = not (window.ir_sum < limit and window.red_sum < limit)
+                    if not finger:
+                        # nothing to measure: skip the HR calculation entirely
+                        self.bpm = 0.0
+                        spo2 = -999
+                        fft_state.clear()
+                    else:
+                        # convert once per tick; hrcalc reuses the arrays as-is and
+                        # only needs the integer dc mean, taken from the running sum
+                        ir_data, red_data = window.arrays()
+                        bpm, valid_bpm, spo2, valid_spo2 = hrcalc.calc_hr_and_spo2(
+                            ir_data, red_data, ir_mean=window.ir_sum // window.filled,
+                            fft_state=fft_state)
+                        if not valid_bpm:
+                            continue
+                        if len(bpms) == bpms.maxlen:
+                            bpm_sum -= bpms[0]
+                        bpm = float(bpm)  # hrcalc returns a numpy scalar
                         bpms.append(bpm)
-                        while len(bpms) > 4:
-                            bpms.pop(0)
-                        self.bpm = np.mean(bpms)
-                        if (np.mean(ir_data) < 50000 and np.mean(red_data) < 50000):
-                            self.bpm = 0
-                            if self.print_result:
-                                print("Finger not detected")
-                        if self.print_result:
-                            print("BPM: {0}, SpO2: {1}".format(self.bpm, spo2))
+                        bpm_sum += bpm
+                        self.bpm = bpm_sum / len(bpms)
 
-            time.sleep(self.LOOP_TIME)
+                    # results are logged at most once per RESULT_LOG_INTERVAL
+                    now = time.monotonic()
+                    if self.print_result and now - last_result_log >= self.RESULT_LOG_INTERVAL:
+                        last_result_log = now
+                        if not finger:
+                            logger.info("Finger not detected")
+                        logger.info("BPM: %s, SpO2: %s", self.bpm, spo2)
 
-        sensor.shutdown()
+        if raw_fp is not None:
+            raw_fp.close()
+        hub.unsubscribe(samples)
 
     def start_sensor(self):
+        self._samples = get_hub().subscribe()
         self._thread = threading.Thread(target=self.run_sensor)
         self._thread.stopped = False
         self._thread.start()
 
     def stop_sensor(self, timeout=2.0):
         self._thread.stopped = True
-        self.bpm = 0
+        self._samples.close()
+        self.bpm = 0.0
         self._thread.join(timeout)
\ No newline at end of file
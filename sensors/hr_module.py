@@ -5,17 +5,22 @@ Based on MAX30102 sensor with enhanced functionality
 Compatible with the main script's expected interface
 """
 
+import csv
 import threading
 import time
 import logging
 import queue
+import statistics
+from bisect import bisect_left
+from collections import deque
+from itertools import islice
 from typing import Optional, List
 from dataclasses import dataclass
-from datetime import datetime
-import numpy as np
+
+from .ppg_window import PPGWindow, SPSCRing
 
 try:
-    from .max30102 import MAX30102
+    from ._max30102_hub import get_hub
     from . import hrcalc
     MAX30102_AVAILABLE = True
 except ImportError:
@@ -41,6 +46,9 @@ class HRSensor:
     
     LOOP_TIME = 0.01
     DETECTION_THRESHOLD = 50000  # Original threshold for finger detection
+    RESULT_LOG_INTERVAL = 1.0  # Seconds between print_result log lines
+    LOG_BATCH_ROWS = 25        # HR log rows written per batch
+    LOG_BATCH_INTERVAL = 0.5   # Max seconds a logged row waits for its batch
     
     def __init__(self, print_raw: bool = False, print_result: bool = False):
         """
@@ -65,24 +73,37 @@ class HRSensor:
         self.print_raw = print_raw
         self.print_result = print_result
         
+        self._last_result_log = 0.0
+        
         # Threading
         self._thread = None
         self._stop_event = threading.Event()
         
         # Data storage
-        self.ir_data = []
-        self.red_data = []
-        self.bpm_history = []
+        self.bpm_history = deque(maxlen=4)  # Original uses 4, not config
         self.latest_reading = None
-        self.readings_history = []
         self.max_history = 1000
+        self.readings_history = deque(maxlen=self.max_history)
+        # Parallel to readings_history, kept sorted for bisect lookups
+        self._reading_times = deque(maxlen=self.max_history)
+        
+        # Vitals are recomputed every N samples once the window is full
+        self._vitals_stride = 10
+        self._vitals_cnt = 0
+        # Phase state carried between windows by hrcalc.estimate_hr_fft
+        self._fft_state = {}
         
         # Baseline data storage
         self.baseline_bpm = None
         self.baseline_timestamp = None
         
         # Data queue for external consumers
-        self.data_queue = queue.Queue(maxsize=100)
+        self.data_queue = SPSCRing(128)
+        
+        # Log writer thread fed by a bounded deque (keeps file IO off the sensor thread)
+        self._log_dq = deque(maxlen=1000)
+        self._log_cv = threading.Condition()
+        self._log_thread = None
         
         # Configuration
         self.config = {
@@ -93,13 +114,17 @@ class HRSensor:
             'detection_threshold': self.DETECTION_THRESHOLD
         }
         
+        # Sliding window of raw samples (ring buffers with running sums)
+        self._window = PPGWindow(self.config['window_size'])
+        
         # Initialize sensor
         self._initialize_sensor()
 
     def _initialize_sensor(self) -> bool:
-        """Initialize the MAX30102 sensor"""
+        """Attach to the shared MAX30102 sensor"""
         try:
-            self.sensor = MAX30102()
+            self._hub = get_hub()
+            self.sensor = self._hub.sensor
             self.connected = True
             logger.info("MAX30102 HR sensor initialized successfully")
             return True
@@ -112,32 +137,40 @@ class HRSensor:
         """Main sensor reading loop (runs in background thread)"""
         logger.info("HR sensor thread started")
         
-        while not self._stop_event.is_set() and self.running:
+        # Bind hot-loop lookups to locals (LOAD_FAST instead of LOAD_ATTR)
+        get_burst = self._samples.get
+        extend = self._window.extend
+        is_full = self._window.is_full
+        stop_is_set = self._stop_event.is_set
+        
+        while not stop_is_set() and self.running:
             try:
-                # Check if any data is available
-                num_bytes = self.sensor.get_data_present()
+                # Wait for the next FIFO burst from the hub
+                try:
+                    burst = get_burst(timeout=0.5)
+                except queue.Empty:
+                    burst = ((), ())
+                if burst is None:
+                    break  # ring closed by stop_sensor
+                red_arr, ir_arr = burst
+                num_samples = len(ir_arr)
                 
-                if num_bytes > 0:
-                    logger.debug(f"MAX30102 data available: {num_bytes} bytes")
-                    # Read all available data
-                    while num_bytes > 0:
-                        red, ir = self.sensor.read_fifo()
-                        num_bytes -= 1
-                        
-                        # Store raw data
-                        self.ir_data.append(ir)
-                        self.red_data.append(red)
-                        
-                        if self.print_raw:
-                            print(f"IR: {ir}, Red: {red}")
-                        
-                        # Maintain window size
-                        while len(self.ir_data) > self.config['window_size']:
-                            self.ir_data.pop(0)
-                            self.red_data.pop(0)
-                        
-                        # Calculate HR and SpO2 when we have enough data
-                        if len(self.ir_data) == self.config['window_size']:
+                if num_samples > 0:
+                    extend(red_arr, ir_arr)
+                    logger.debug("MAX30102 data available: %d samples", num_samples)
+                    
+                    if self.print_raw and logger.isEnabledFor(logging.DEBUG):
+                        # one log record per burst instead of one per sample
+                        logger.debug("\n".join(
+                            "IR: %d, Red: %d" % pair
+                            for pair in zip(ir_arr.tolist(), red_arr.tolist())))
+                    
+                    # Calculate HR and SpO2 when we have enough data
+                    if is_full():
+                        self._vitals_cnt += num_samples
+                        if self._vitals_cnt >= self._vitals_stride:
+                            self._fft_state['hop'] = self._vitals_cnt
+                            self._vitals_cnt = 0
                             self._calculate_vitals()
                 else:
                     # Log occasionally when no data is available
@@ -146,33 +179,34 @@ class HRSensor:
                     else:
                         self._no_data_count = 1
                     
-                    if self._no_data_count % 1000 == 0:  # Log every 1000 iterations (10 seconds)
+                    if self._no_data_count % 20 == 0:  # Log every 20 timeouts (10 seconds)
                         logger.debug(f"MAX30102: No data available (iteration {self._no_data_count})")
                 
-                time.sleep(self.LOOP_TIME)
-                
             except Exception as e:
                 logger.error(f"Error in HR sensor thread: {e}")
                 time.sleep(0.1)
         
-        # Shutdown sensor when thread exits
-        try:
-            self.sensor.shutdown()
-            logger.info("MAX30102 sensor shutdown")
-        except Exception as e:
-            logger.warning(f"Error shutting down sensor: {e}")
+        # Let the hub shut the sensor down once no reader is left
+        self._hub.unsubscribe(self._samples)
 
     def _calculate_vitals(self):
         """Calculate heart rate  from collected data"""
         try:
-            # Calculate HR (ignore SpO2 since we don't use it for ML)
-            bpm, valid_bpm, _, _ = hrcalc.calc_hr_and_spo2(
-                self.ir_data, self.red_data
-            )
+            # Means from the running sums
+            mean_ir = self._window.ir_mean
+            mean_red = self._window.red_mean
             
-            # Check finger detection
-            mean_ir = np.mean(self.ir_data)
-            mean_red = np.mean(self.red_data)
+            if max(mean_ir, mean_red) < self.config['detection_threshold'] * 0.5:
+                # Finger clearly absent - skip the HR calculation entirely
+                bpm, valid_bpm = 0.0, False
+                # The next window is not contiguous with the last analysed one
+                self._fft_state.clear()
+            else:
+                # Calculate HR (ignore SpO2 since we don't use it for ML)
+                ir_data, red_data = self._window.arrays()
+                bpm, valid_bpm, _, _ = hrcalc.calc_hr_and_spo2(
+                    ir_data, red_data, ir_mean=mean_ir, fft_state=self._fft_state
+                )
             
             # Log finger detection status occasionally
             if hasattr(self, '_finger_log_count'):
@@ -191,21 +225,20 @@ class HRSensor:
                 self.finger_detected = False
                 valid_bpm = False
                 
-                if self.print_result:
-                    print("Finger not detected")
+                if self.print_result and self._result_log_due():
+                    logger.info("Finger not detected")
             else:
                 self.finger_detected = True
                 
-                # Smooth BPM using history (original logic)
+                # Smooth BPM using history; the median ignores a single
+                # outlier window that would drag the mean
                 if valid_bpm:
-                    self.bpm_history.append(bpm)
-                    while len(self.bpm_history) > 4:  # Original uses 4, not config
-                        self.bpm_history.pop(0)
+                    self.bpm_history.append(float(bpm))
                     
-                    self.bpm = np.mean(self.bpm_history)
+                    self.bpm = statistics.median(self.bpm_history)
                     
-                    if self.print_result:
-                        print(f"BPM: {self.bpm:.1f}")
+                    if self.print_result and self._result_log_due():
+                        logger.info("BPM: %.1f", self.bpm)
             
             # Create reading object
             reading = HRReading(
@@ -222,20 +255,11 @@ class HRSensor:
             self.latest_reading = reading
             
             # Add to history
+            self._reading_times.append(reading.timestamp)
             self.readings_history.append(reading)
-            if len(self.readings_history) > self.max_history:
-                self.readings_history.pop(0)
             
-            # Add to queue for external consumers
-            try:
-                self.data_queue.put_nowait(reading)
-            except queue.Full:
-                # Remove oldest and add new
-                try:
-                    self.data_queue.get_nowait()
-                    self.data_queue.put_nowait(reading)
-                except queue.Empty:
-                    pass
+            # Add to queue for external consumers (dropped when full)
+            self.data_queue.put_nowait(reading)
             
             # Optional data logging
             if self.config['log_data']:
@@ -244,14 +268,66 @@ class HRSensor:
         except Exception as e:
             logger.error(f"Error calculating vitals: {e}")
 
+    def _result_log_due(self) -> bool:
+        """Rate-limit result logging to once per RESULT_LOG_INTERVAL"""
+        now = time.monotonic()
+        if now - self._last_result_log < self.RESULT_LOG_INTERVAL:
+            return False
+        self._last_result_log = now
+        return True
+
     def _log_reading(self, reading: HRReading):
-        """Log HR reading to file"""
+        """Queue HR reading for the log writer thread"""
+        self._log_dq.append(reading)
+        with self._log_cv:
+            self._log_cv.notify()
+
+    def _run_log_writer(self):
+        """Write queued HR readings to file (runs in background thread)"""
         try:
-            with open(self.config['log_file'], "a") as f:
-                timestamp_str = datetime.fromtimestamp(reading.timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                f.write(f"{timestamp_str},{reading.bpm:.1f},{reading.finger_detected}\n")
+            f = open(self.config['log_file'], "a", newline="", buffering=8192)
         except Exception as e:
-            logger.warning(f"Failed to log HR data: {e}")
+            logger.warning(f"Failed to open HR log file: {e}")
+            return
+        
+        writer = csv.writer(f, lineterminator="\n")
+        stop_is_set = self._stop_event.is_set
+        rows = []
+        last_write = time.monotonic()
+        # Seconds part of the timestamp only changes once per second
+        last_sec = -1
+        last_sec_str = ""
+        with f:
+            while True:
+                with self._log_cv:
+                    self._log_cv.wait_for(lambda: self._log_dq or stop_is_set(),
+                                          timeout=self.LOG_BATCH_INTERVAL)
+                stopping = stop_is_set()
+                
+                while self._log_dq:
+                    reading = self._log_dq.popleft()
+                    ts = reading.timestamp
+                    sec = int(ts)
+                    if sec != last_sec:
+                        last_sec = sec
+                        last_sec_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+                    ms = int((ts - sec) * 1000)
+                    rows.append((f"{last_sec_str}.{ms:03d}", f"{reading.bpm:.1f}", reading.finger_detected))
+                
+                # Write in batches of LOG_BATCH_ROWS or every LOG_BATCH_INTERVAL
+                now = time.monotonic()
+                if rows and (stopping or len(rows) >= self.LOG_BATCH_ROWS
+                             or now - last_write >= self.LOG_BATCH_INTERVAL):
+                    try:
+                        writer.writerows(rows)
+                    except Exception as e:
+                        logger.warning(f"Failed to log HR data: {e}")
+                    rows.clear()
+                    last_write = now
+                
+                # Stop requested and nothing left to write (file is flushed on close)
+                if stopping and not self._log_dq:
+                    break
 
     def start_sensor(self) -> bool:
         """
@@ -271,9 +347,14 @@ class HRSensor:
         try:
             self.running = True
             self._stop_event.clear()
+            self._samples = self._hub.subscribe()
             self._thread = threading.Thread(target=self._run_sensor, daemon=True)
             self._thread.start()
             
+            if self.config['log_data']:
+                self._log_thread = threading.Thread(target=self._run_log_writer, daemon=True)
+                self._log_thread.start()
+            
             logger.info("HR sensor started successfully")
             return True
             
@@ -295,10 +376,18 @@ class HRSensor:
         logger.info("Stopping HR sensor...")
         self.running = False
         self._stop_event.set()
+        # Wake the sensor thread if it is waiting for the next burst
+        self._samples.close()
         
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout)
         
+        # Wake the log writer so it drains pending readings and exits
+        with self._log_cv:
+            self._log_cv.notify_all()
+        if self._log_thread and self._log_thread.is_alive():
+            self._log_thread.join(timeout)
+        
         self.bpm = 0.0
       
         self.finger_detected = False
@@ -320,7 +409,12 @@ class HRSensor:
         return self.read_max30106_HR()
 
     def get_bpm(self) -> float:
-        """Get current BPM value"""
+        """
+        Get current BPM value
+        
+        bpm is a plain float written only by the sensor thread, so it is
+        read without a lock (last write wins)
+        """
         return self.bpm
 
     def is_finger_detected(self) -> bool:
@@ -346,7 +440,7 @@ class HRSensor:
         Returns:
             List of recent HRReading objects
         """
-        return self.readings_history[-count:] if self.readings_history else []
+        return list(self.readings_history)[-count:] if self.readings_history else []
 
     def get_readings_in_timeframe(self, duration_seconds: int) -> List[HRReading]:
         """
@@ -362,7 +456,8 @@ class HRSensor:
             return []
         
         cutoff_time = time.time() - duration_seconds
-        return [r for r in self.readings_history if r.timestamp >= cutoff_time]
+        start = bisect_left(self._reading_times, cutoff_time)
+        return list(islice(self.readings_history, start, None))
 
     def is_connected(self) -> bool:
         """
@@ -395,7 +490,6 @@ class HRSensor:
         
         detection_rate = len(valid_readings) / len(recent_readings) if recent_readings else 0.0
         
-        import statistics
         return {
             'count': len(valid_readings),
             'bpm_min': min(bpm_values),
@@ -425,7 +519,6 @@ class HRSensor:
         
         if len(valid_readings) >= 5:  # Need at least 5 valid readings
             bpm_values = [r.bpm for r in valid_readings]
-            import statistics
             return statistics.mean(bpm_values)
         return None
 
@@ -476,5 +569,9 @@ if __name__ == "__main__":
                         help="duration in seconds to read from sensor, default 30")
     args = parser.parse_args()
     
+    # Raw samples are logged at DEBUG, results at INFO
+    logging.basicConfig(level=logging.DEBUG if args.raw else logging.INFO,
+                        format='%(message)s')
+    
     # Run standalone test
     test_hr_sensor(duration=args.time, print_raw=args.raw)
\ No newline at end of file
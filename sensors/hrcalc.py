@@ -1,7 +1,18 @@
 # -*-coding:utf-8
 
+from functools import lru_cache
+
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it the kernels below run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
 # 25 samples per second (in algorithm.h)
 SAMPLE_FREQ = 25
 # taking moving average of 4 samples when calculating HR
@@ -9,43 +20,149 @@ SAMPLE_FREQ = 25
 MA_SIZE = 4
 # sampling frequency * 4 (in algorithm.h)
 BUFFER_SIZE = 100
-
-
-# this assumes ir_data and red_data as np.array
-def calc_hr_and_spo2(ir_data, red_data):
+# maximum number of peaks kept by find_peaks
+MAX_PEAKS = 15
+# maximum number of SpO2 ratios averaged
+MAX_RATIOS = 5
+# zero-padded FFT length and heart rate band (Hz) for the spectral HR estimate
+FFT_SIZE = 1024
+HR_BAND_LOW = 0.6
+HR_BAND_HIGH = 4.0
+# spectral and autocorrelation HR estimates must agree within this many bpm
+HR_AGREEMENT_BPM = 10
+
+
+def calc_hr_and_spo2(ir_data, red_data, ir_mean=None, fft_state=None):
     """
     By detecting  peaks of PPG cycle and corresponding AC/DC
     of red/infra-red signal, the an_ratio for the SPO2 is computed.
+    ir_data and red_data may be lists or arrays; int32 arrays are used as-is.
+    ir_mean may be passed in when the caller already tracks it.
+    Heart rate comes from the spectrum (see estimate_hr_fft) and is only
+    reported valid when the peak detector finds at least two beats;
+    fft_state is passed through to estimate_hr_fft.
     """
+    ir_data = np.ascontiguousarray(ir_data, dtype=np.int32)
+    red_data = np.ascontiguousarray(red_data, dtype=np.int32)
     # get dc mean
-    ir_mean = int(np.mean(ir_data))
+    if ir_mean is None:
+        ir_mean = np.mean(ir_data)
+    hr_valid, spo2, spo2_valid = _calc_hr_and_spo2(ir_data, red_data, int(ir_mean))
+    if hr_valid:
+        # both estimators share one centred float32 copy, kept in fft_state
+        # so consecutive windows reuse the same buffer
+        sig = _centered(ir_data, None if fft_state is None else fft_state.get('sig'))
+        if fft_state is not None:
+            fft_state['sig'] = sig
+        hr = _hr_fft(sig, SAMPLE_FREQ, fft_state)
+        # cross-check against the autocorrelation period to reject noisy windows
+        hr_valid = bool(abs(hr - _hr_autocorr(sig, SAMPLE_FREQ)) < HR_AGREEMENT_BPM)
+    else:
+        hr = -999  # unable to calculate because # of peaks are too small
+        if fft_state is not None:
+            # callers set 'hop' to the samples since the last call only, so
+            # the next phase advance would span more than one hop
+            fft_state.pop('k', None)
+    return hr, hr_valid, spo2, spo2_valid
 
+
+@lru_cache(maxsize=4)
+def _fft_tables(n, fs):
+    """Hann window, bin frequencies and HR band mask for an n-sample window"""
+    window = np.hanning(n).astype(np.float32)
+    freqs = np.fft.rfftfreq(FFT_SIZE, 1.0 / fs)
+    band = (freqs >= HR_BAND_LOW) & (freqs <= HR_BAND_HIGH)
+    return window, freqs, band
+
+
+def _centered(x, out=None):
+    """x minus its mean as float32, written into out when it fits"""
+    if out is None or out.shape != x.shape:
+        out = np.empty(x.shape, dtype=np.float32)
+    # 18-bit samples are exact in float32; the AC part needs no more precision
+    np.copyto(out, x, casting='unsafe')
+    np.subtract(out, out.mean(), out=out)
+    return out
+
+
+def estimate_hr_fft(x, fs=SAMPLE_FREQ, state=None):
+    """
+    Estimate heart rate (bpm) from the strongest spectral peak of x in the
+    HR band, using a Hann window zero-padded to FFT_SIZE.
+    state is an optional dict kept by the caller across consecutive windows;
+    when it holds 'hop' (new samples since the previous call) and the previous
+    peak bin is unchanged, the frequency is refined from the phase advance of
+    that bin (phase vocoder). It is updated in place.
+    """
+    return _hr_fft(_centered(np.asarray(x)), fs, state)
+
+
+def _hr_fft(sig, fs, state):
+    """estimate_hr_fft on an already centred float32 signal"""
+    window, freqs, band = _fft_tables(len(sig), fs)
+    spectrum = np.fft.rfft(sig * window, n=FFT_SIZE)
+    k = int(np.argmax(np.abs(spectrum) * band))
+    freq = float(freqs[k])
+
+    if state is not None:
+        phase = float(np.angle(spectrum[k]))
+        hop = state.get('hop', 0)
+        if hop > 0 and state.get('k') == k:
+            # deviation of the measured phase advance from the bin centre's
+            dphi = phase - state['phase'] - 2 * np.pi * k * hop / FFT_SIZE
+            dphi = (dphi + np.pi) % (2 * np.pi) - np.pi
+            refined = freq + dphi * fs / (2 * np.pi * hop)
+            # only trust refinements that stay within one bin
+            if abs(refined - freq) <= fs / FFT_SIZE:
+                freq = refined
+        state['k'] = k
+        state['phase'] = phase
+
+    return 60.0 * freq
+
+
+def estimate_hr_autocorr(x, fs=SAMPLE_FREQ):
+    """
+    Estimate heart rate (bpm) from the autocorrelation of x: the distance
+    between its first and third zero crossings is one period.
+    Returns 0.0 when fewer than three crossings are found.
+    """
+    return _hr_autocorr(_centered(np.asarray(x)), fs)
+
+
+def _hr_autocorr(sig, fs):
+    """estimate_hr_autocorr on an already centred float32 signal"""
+    r = np.correlate(sig, sig, 'full')[len(sig)-1:]
+    zc = np.nonzero(np.diff(np.sign(r)))[0]
+    if len(zc) < 3:
+        return 0.0
+    # interpolate each crossing linearly between the samples around it
+    lags = zc + r[zc] / (r[zc] - r[zc+1])
+    period = lags[2] - lags[0]
+    return float(60.0 * fs / period) if period > 0 else 0.0
+
+
+@njit(cache=True)
+def _calc_hr_and_spo2(ir_data, red_data, ir_mean):
     # remove DC mean and inver signal
     # this lets peak detecter detect valley
-    x = -1 * (np.array(ir_data) - ir_mean)
+    x = -1 * (ir_data.astype(np.int64) - ir_mean)
 
-    # 4 point moving average
-    # x is np.array with int values, so automatically casted to int
-    for i in range(x.shape[0] - MA_SIZE):
-        x[i] = np.sum(x[i:i+MA_SIZE]) / MA_SIZE
+    # 4 point moving average as one vectorized pass over a cumulative sum
+    # results are truncated to int; the last MA_SIZE samples are left as-is
+    n = x.shape[0]
+    c = np.cumsum(np.concatenate((np.zeros(1, dtype=np.int64), x)))
+    x[:n-MA_SIZE] = ((c[MA_SIZE:n] - c[:n-MA_SIZE]) / MA_SIZE).astype(np.int64)
 
     # calculate threshold
     n_th = int(np.mean(x))
     n_th = 30 if n_th < 30 else n_th  # min allowed
     n_th = 60 if n_th > 60 else n_th  # max allowed
 
-    ir_valley_locs, n_peaks = find_peaks(x, BUFFER_SIZE, n_th, 4, 15)
+    ir_valley_locs, n_peaks = find_peaks(x, BUFFER_SIZE, n_th, 4, MAX_PEAKS)
     # print(ir_valley_locs[:n_peaks], ",", end="")
-    peak_interval_sum = 0
-    if n_peaks >= 2:
-        for i in range(1, n_peaks):
-            peak_interval_sum += (ir_valley_locs[i] - ir_valley_locs[i-1])
-        peak_interval_sum = int(peak_interval_sum / (n_peaks - 1))
-        hr = int(SAMPLE_FREQ * 60 / peak_interval_sum)
-        hr_valid = True
-    else:
-        hr = -999  # unable to calculate because # of peaks are too small
-        hr_valid = False
+    # the rate itself is estimated from the spectrum by the caller
+    hr_valid = n_peaks >= 2
 
     # ---------spo2---------
 
@@ -58,28 +175,24 @@ def calc_hr_and_spo2(ir_data, red_data):
     # FIXME: needed??
     for i in range(exact_ir_valley_locs_count):
         if ir_valley_locs[i] > BUFFER_SIZE:
-            spo2 = -999  # do not use SPO2 since valley loc is out of range
+            spo2 = -999.0  # do not use SPO2 since valley loc is out of range
             spo2_valid = False
-            return hr, hr_valid, spo2, spo2_valid
+            return hr_valid, spo2, spo2_valid
 
     i_ratio_count = 0
-    ratio = []
+    ratio = np.empty(MAX_RATIOS, dtype=np.int64)
 
     # find max between two valley locations
     # and use ratio between AC component of Ir and Red DC component of Ir and Red for SpO2
-    red_dc_max_index = -1
-    ir_dc_max_index = -1
     for k in range(exact_ir_valley_locs_count-1):
-        red_dc_max = -16777216
-        ir_dc_max = -16777216
         if ir_valley_locs[k+1] - ir_valley_locs[k] > 3:
-            for i in range(ir_valley_locs[k], ir_valley_locs[k+1]):
-                if ir_data[i] > ir_dc_max:
-                    ir_dc_max = ir_data[i]
-                    ir_dc_max_index = i
-                if red_data[i] > red_dc_max:
-                    red_dc_max = red_data[i]
-                    red_dc_max_index = i
+            # argmax returns the first maximum, same as the original strict > scan
+            s_ir = ir_data[ir_valley_locs[k]:ir_valley_locs[k+1]]
+            s_red = red_data[ir_valley_locs[k]:ir_valley_locs[k+1]]
+            ir_dc_max_index = ir_valley_locs[k] + int(s_ir.argmax())
+            red_dc_max_index = ir_valley_locs[k] + int(s_red.argmax())
+            ir_dc_max = ir_data[ir_dc_max_index]
+            red_dc_max = red_data[red_dc_max_index]
 
             red_ac = int((red_data[ir_valley_locs[k+1]] - red_data[ir_valley_locs[k]]) * (red_dc_max_index - ir_valley_locs[k]))
             red_ac = red_data[ir_valley_locs[k]] + int(red_ac / (ir_valley_locs[k+1] - ir_valley_locs[k]))
@@ -89,24 +202,26 @@ def calc_hr_and_spo2(ir_data, red_data):
             ir_ac = ir_data[ir_valley_locs[k]] + int(ir_ac / (ir_valley_locs[k+1] - ir_valley_locs[k]))
             ir_ac = ir_data[ir_dc_max_index] - ir_ac  # subtract linear DC components from raw
 
-            nume = red_ac * ir_dc_max
-            denom = ir_ac * red_dc_max
-            if (denom > 0 and i_ratio_count < 5) and nume != 0:
+            # widen to 64-bit so fixed-width array elements cannot overflow
+            nume = np.int64(red_ac) * np.int64(ir_dc_max)
+            denom = np.int64(ir_ac) * np.int64(red_dc_max)
+            if (denom > 0 and i_ratio_count < MAX_RATIOS) and nume != 0:
                 # original cpp implementation uses overflow intentionally.
                 # but at 64-bit OS, Pyhthon 3.X uses 64-bit int and nume*100/denom does not trigger overflow
                 # so using bit operation ( &0xffffffff ) is needed
-                ratio.append(int(((nume * 100) & 0xffffffff) / denom))
+                ratio[i_ratio_count] = int(((nume * 100) & 0xffffffff) / denom)
                 i_ratio_count += 1
 
     # choose median value since PPG signal may vary from beat to beat
-    ratio = sorted(ratio)  # sort to ascending order
+    ratio = ratio[:i_ratio_count]
+    ratio.sort()  # sort to ascending order, in place
     mid_index = int(i_ratio_count / 2)
 
     ratio_ave = 0
     if mid_index > 1:
         ratio_ave = int((ratio[mid_index-1] + ratio[mid_index])/2)
     else:
-        if len(ratio) != 0:
+        if i_ratio_count != 0:
             ratio_ave = ratio[mid_index]
 
     # why 184?
@@ -116,12 +231,13 @@ def calc_hr_and_spo2(ir_data, red_data):
         spo2 = -45.060 * (ratio_ave**2) / 10000.0 + 30.054 * ratio_ave / 100.0 + 94.845
         spo2_valid = True
     else:
-        spo2 = -999
+        spo2 = -999.0
         spo2_valid = False
 
-    return hr, hr_valid, spo2, spo2_valid
+    return hr_valid, spo2, spo2_valid
 
 
+@njit(cache=True)
 def find_peaks(x, size, min_height, min_dist, max_num):
     """
     Find at most MAX_NUM peaks above MIN_HEIGHT separated by at least MIN_DISTANCE
@@ -129,11 +245,12 @@ def find_peaks(x, size, min_height, min_dist, max_num):
     ir_valley_locs, n_peaks = find_peaks_above_min_height(x, size, min_height, max_num)
     ir_valley_locs, n_peaks = remove_close_peaks(n_peaks, ir_valley_locs, x, min_dist)
 
-    n_peaks = min([n_peaks, max_num])
+    n_peaks = min(n_peaks, max_num)
 
     return ir_valley_locs, n_peaks
 
 
+@njit(cache=True)
 def find_peaks_above_min_height(x, size, min_height, max_num):
     """
     Find all peaks above MIN_HEIGHT
@@ -141,7 +258,7 @@ def find_peaks_above_min_height(x, size, min_height, max_num):
 
     i = 0
     n_peaks = 0
-    ir_valley_locs = []  # [0 for i in range(max_num)]
+    ir_valley_locs = np.empty(max_num, dtype=np.int64)
     while i < size - 1:
         if x[i] > min_height and x[i] > x[i-1]:  # find the left edge of potential peaks
             n_width = 1
@@ -150,8 +267,7 @@ def find_peaks_above_min_height(x, size, min_height, max_num):
             while i + n_width < size - 1 and x[i] == x[i+n_width]:  # find flat peaks
                 n_width += 1
             if x[i] > x[i+n_width] and n_peaks < max_num:  # find the right edge of peaks
-                # ir_valley_locs[n_peaks] = i
-                ir_valley_locs.append(i)
+                ir_valley_locs[n_peaks] = i
                 n_peaks += 1  # original uses post increment
                 i += n_width + 1
             else:
@@ -162,6 +278,7 @@ def find_peaks_above_min_height(x, size, min_height, max_num):
     return ir_valley_locs, n_peaks
 
 
+@njit(cache=True)
 def remove_close_peaks(n_peaks, ir_valley_locs, x, min_dist):
     """
     Remove peaks separated by less than MIN_DISTANCE
@@ -170,8 +287,9 @@ def remove_close_peaks(n_peaks, ir_valley_locs, x, min_dist):
     # should be equal to maxim_sort_indices_descend
     # order peaks from large to small
     # should ignore index:0
-    sorted_indices = sorted(ir_valley_locs, key=lambda i: x[i])
-    sorted_indices.reverse()
+    # (equal heights keep the later peak first)
+    sorted_indices = ir_valley_locs
+    sort_indices_descend(x, sorted_indices, n_peaks)
 
     # this "for" loop expression does not check finish condition
     # for i in range(-1, n_peaks):
@@ -190,6 +308,20 @@ def remove_close_peaks(n_peaks, ir_valley_locs, x, min_dist):
             j += 1
         i += 1
 
-    sorted_indices[:n_peaks] = sorted(sorted_indices[:n_peaks])
+    sorted_indices[:n_peaks].sort()
+
+    return sorted_indices, n_peaks
 
-    return sorted_indices, n_peaks
\ No newline at end of file
+
+@njit(cache=True)
+def sort_indices_descend(x, indices, n):
+    """
+    In-place insertion sort of indices[:n] by descending x[indices]
+    """
+    for k in range(1, n):
+        temp = indices[k]
+        j = k
+        while j > 0 and x[temp] >= x[indices[j-1]]:
+            indices[j] = indices[j-1]
+            j -= 1
+        indices[j] = temp
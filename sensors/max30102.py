@@ -2,8 +2,20 @@
 
 # this code is currently for python 2.7
 from __future__ import print_function
+import logging
+import struct
 from time import sleep
-import smbus
+from smbus2 import SMBus, i2c_msg
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # numba is optional; without it samples are unpacked with NumPy ops
+    NUMBA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
 
 # register addresses
 REG_INTR_STATUS_1 = 0x00
@@ -34,21 +46,69 @@ REG_PROX_INT_THRESH = 0x30
 REG_REV_ID = 0xFE
 REG_PART_ID = 0xFF
 
+# the FIFO holds at most 32 samples
+FIFO_DEPTH = 32
+
+# one SpO2-mode sample: red and ir as big-endian 24-bit (16 + 8 bit) words
+_SAMPLE_STRUCT = struct.Struct('>HBHB')
+# per-byte shifts that assemble a big-endian 3-byte FIFO word
+_BYTE_SHIFTS = np.array([16, 8, 0], dtype=np.uint32)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _unpack_samples(data, n, out_red, out_ir):
+        """Unpack n 6-byte FIFO samples into 18-bit red/ir values"""
+        for i in range(n):
+            b = i * 6
+            out_red[i] = ((data[b] & 3) << 16) | (data[b+1] << 8) | data[b+2]
+            out_ir[i] = ((data[b+3] & 3) << 16) | (data[b+4] << 8) | data[b+5]
+
+
+# bus clock needed to drain the FIFO at full sample rates
+I2C_FAST_MODE_HZ = 400000
+
+
+def check_i2c_clock(channel):
+    """
+    Warn if the I2C adapter runs slower than fast mode (400 kHz).
+    On a Raspberry Pi set dtparam=i2c_arm_baudrate=400000 in
+    /boot/config.txt. Returns the clock in Hz, or None if unknown.
+    """
+    path = "/sys/class/i2c-adapter/i2c-{0}/of_node/clock-frequency".format(channel)
+    try:
+        with open(path, "rb") as f:
+            # device tree property: one big-endian 32-bit cell
+            clock_hz = int.from_bytes(f.read(4), "big")
+    except (OSError, ValueError):
+        return None
+    if clock_hz < I2C_FAST_MODE_HZ:
+        logger.warning("I2C bus %d runs at %d Hz; MAX30102 FIFO reads need %d Hz "
+                       "(set dtparam=i2c_arm_baudrate=%d)",
+                       channel, clock_hz, I2C_FAST_MODE_HZ, I2C_FAST_MODE_HZ)
+    return clock_hz
+
 
 class MAX30102():
+    """
+    MAX30102 pulse oximeter on I2C.
+    The bus should run in fast mode (400 kHz); at the 100 kHz default
+    each FIFO burst takes four times as long on the wire.
+    """
     # by default, this assumes that the device is at 0x57 on channel 1
     def __init__(self, channel=1, address=0x57):
         #print("Channel: {0}, address: {1}".format(channel, address))
         self.address = address
         self.channel = channel
-        self.bus = smbus.SMBus(self.channel)
+        check_i2c_clock(self.channel)
+        self.bus = SMBus(self.channel)
+        # samples lost to FIFO overflow since startup
+        self.fifo_overflows = 0
 
         self.reset()
 
-        sleep(1)  # wait 1 sec
-
         # read & clear interrupt register (read 1 byte)
-        reg_data = self.bus.read_i2c_block_data(self.address, REG_INTR_STATUS_1, 1)
+        reg_data = self._read_block(REG_INTR_STATUS_1, 1)
         # print("[SETUP] reset complete with interrupt register0: {0}".format(reg_data))
         self.setup()
         # print("[SETUP] setup complete")
@@ -63,42 +123,66 @@ class MAX30102():
         """
         Reset the device, this will clear all settings,
         so after running this, run setup() again.
+        Returns once the RESET bit self-clears (at most ~1 sec).
         """
         self.bus.write_i2c_block_data(self.address, REG_MODE_CONFIG, [0x40])
+        # poll every 10 ms instead of always waiting the full second
+        for _ in range(100):
+            if not self._read_block(REG_MODE_CONFIG, 1)[0] & 0x40:
+                break
+            sleep(0.01)
 
     def setup(self, led_mode=0x03):
         """
         This will setup the device with the values written in sample Arduino code.
         """
-        # INTR setting
-        # 0xc0 : A_FULL_EN and PPG_RDY_EN = Interrupt will be triggered when
-        # fifo almost full & new fifo data ready
-        self.bus.write_i2c_block_data(self.address, REG_INTR_ENABLE_1, [0xc0])
-        self.bus.write_i2c_block_data(self.address, REG_INTR_ENABLE_2, [0x00])
-
-        # FIFO_WR_PTR[4:0]
-        self.bus.write_i2c_block_data(self.address, REG_FIFO_WR_PTR, [0x00])
-        # OVF_COUNTER[4:0]
-        self.bus.write_i2c_block_data(self.address, REG_OVF_COUNTER, [0x00])
-        # FIFO_RD_PTR[4:0]
-        self.bus.write_i2c_block_data(self.address, REG_FIFO_RD_PTR, [0x00])
-
-        # 0b 0100 1111
-        # sample avg = 4, fifo rollover = false, fifo almost full = 17
-        self.bus.write_i2c_block_data(self.address, REG_FIFO_CONFIG, [0x4f])
-
-        # 0x02 for read-only, 0x03 for SpO2 mode, 0x07 multimode LED
-        self.bus.write_i2c_block_data(self.address, REG_MODE_CONFIG, [led_mode])
-        # 0b 0010 0111
-        # SPO2_ADC range = 4096nA, SPO2 sample rate = 100Hz, LED pulse-width = 411uS
-        self.bus.write_i2c_block_data(self.address, REG_SPO2_CONFIG, [0x27])
-
-        # choose value for ~7mA for LED1
-        self.bus.write_i2c_block_data(self.address, REG_LED1_PA, [0x24])
-        # choose value for ~7mA for LED2
-        self.bus.write_i2c_block_data(self.address, REG_LED2_PA, [0x24])
-        # choose value fro ~25mA for Pilot LED
-        self.bus.write_i2c_block_data(self.address, REG_PILOT_PA, [0x7f])
+        # Contiguous registers are written as one block each (the register
+        # pointer auto-increments) and all blocks go out in one I2C_RDWR call
+        self._write_blocks(
+            # INTR setting (0x02-0x03) and FIFO pointers (0x04-0x06)
+            # 0x80 : A_FULL_EN only = Interrupt will be triggered when fifo is
+            # almost full (17 samples), so one interrupt drains a whole batch
+            # instead of one per sample (PPG_RDY_EN). A_FULL is latched: INT
+            # stays low until INTR_STATUS_1 is read (clear_interrupts()),
+            # not when the FIFO is read
+            # FIFO_WR_PTR[4:0], OVF_COUNTER[4:0], FIFO_RD_PTR[4:0] = 0
+            (REG_INTR_ENABLE_1, [0x80, 0x00, 0x00, 0x00, 0x00]),
+            # FIFO, mode and SpO2 config (0x08-0x0A)
+            # 0b 0100 1111
+            # sample avg = 4, fifo rollover = false, fifo almost full = 17
+            # 0x02 for read-only, 0x03 for SpO2 mode, 0x07 multimode LED
+            # 0b 0010 0111
+            # SPO2_ADC range = 4096nA, SPO2 sample rate = 100Hz, LED pulse-width = 411uS
+            (REG_FIFO_CONFIG, [0x4f, led_mode, 0x27]),
+            # choose value for ~7mA for LED1 and LED2 (0x0C-0x0D)
+            (REG_LED1_PA, [0x24, 0x24]),
+            # choose value fro ~25mA for Pilot LED
+            (REG_PILOT_PA, [0x7f]),
+        )
+
+        # cache the FIFO sample layout instead of reading the mode back;
+        # heart rate mode (0x02) stores only the red channel, 3 bytes per sample
+        self._mode = led_mode
+        self._bytes_per_sample = 3 if led_mode == 0x02 else 6
+
+    def _read_block(self, reg, length):
+        """
+        Read `length` bytes starting at `reg` as one combined
+        write/read transaction (I2C_RDWR ioctl, GIL released).
+        Unlike SMBus block reads this is not limited to 32 bytes.
+        """
+        msg_w = i2c_msg.write(self.address, [reg])
+        msg_r = i2c_msg.read(self.address, length)
+        self.bus.i2c_rdwr(msg_w, msg_r)
+        return bytes(msg_r)
+
+    def _write_blocks(self, *blocks):
+        """
+        Write each (reg, values) block as its own message, all in one
+        combined I2C_RDWR transaction.
+        """
+        msgs = [i2c_msg.write(self.address, [reg] + list(values)) for reg, values in blocks]
+        self.bus.i2c_rdwr(*msgs)
 
     # this won't validate the arguments!
     # use when changing the values from default
@@ -106,16 +190,29 @@ class MAX30102():
         self.bus.write_i2c_block_data(self.address, reg, value)
 
     def get_data_present(self):
-        read_ptr = self.bus.read_byte_data(self.address, REG_FIFO_RD_PTR)
-        write_ptr = self.bus.read_byte_data(self.address, REG_FIFO_WR_PTR)
-        if read_ptr == write_ptr:
-            return 0
-        else:
-            num_samples = write_ptr - read_ptr
-            # account for pointer wrap around
-            if num_samples < 0:
-                num_samples += 32
-            return num_samples
+        """
+        Number of unread samples in the FIFO.
+        FIFO_WR_PTR, OVF_COUNTER and FIFO_RD_PTR are adjacent and read in
+        one transaction; a non-zero overflow count means the FIFO is full
+        (the pointers are then equal) and samples were lost.
+        """
+        write_ptr, ovf_counter, read_ptr = self._read_block(REG_FIFO_WR_PTR, 3)
+        # account for pointer wrap around
+        num_samples = (write_ptr - read_ptr) & (FIFO_DEPTH - 1)
+        if ovf_counter:
+            self.fifo_overflows += ovf_counter
+            if num_samples == 0:
+                num_samples = FIFO_DEPTH
+        return num_samples
+
+    def clear_interrupts(self):
+        """
+        Read (and so clear) both interrupt status registers.
+        The status flags, A_FULL included, are latched and INT stays low
+        until INTR_STATUS_1 is read; reading FIFO_DATA only clears PPG_RDY.
+        Returns INTR_STATUS_1.
+        """
+        return self._read_block(REG_INTR_STATUS_1, 2)[0]
 
     def read_fifo(self):
         """
@@ -124,19 +221,49 @@ class MAX30102():
         red_led = None
         ir_led = None
 
-        # read 1 byte from registers (values are discarded)
-        reg_INTR1 = self.bus.read_i2c_block_data(self.address, REG_INTR_STATUS_1, 1)
-        reg_INTR2 = self.bus.read_i2c_block_data(self.address, REG_INTR_STATUS_2, 1)
+        # read both interrupt registers (values are discarded)
+        reg_INTR = self._read_block(REG_INTR_STATUS_1, 2)
 
         # read 6-byte data from the device
-        d = self.bus.read_i2c_block_data(self.address, REG_FIFO_DATA, 6)
+        red_hi, red_lo, ir_hi, ir_lo = _SAMPLE_STRUCT.unpack_from(
+            self._read_block(REG_FIFO_DATA, 6))
 
         # mask MSB [23:18]
-        red_led = (d[0] << 16 | d[1] << 8 | d[2]) & 0x03FFFF
-        ir_led = (d[3] << 16 | d[4] << 8 | d[5]) & 0x03FFFF
+        red_led = (red_hi << 8 | red_lo) & 0x03FFFF
+        ir_led = (ir_hi << 8 | ir_lo) & 0x03FFFF
 
         return red_led, ir_led
 
+    def read_fifo_burst(self, num_samples):
+        """
+        Read `num_samples` samples from the data register in a single
+        block read (the FIFO pointer auto-advances) and return them as
+        (red, ir) arrays. At most FIFO_DEPTH samples are read.
+        Interrupt status registers are not touched.
+        """
+        num_samples = min(num_samples, FIFO_DEPTH)
+        bytes_per_sample = self._bytes_per_sample
+        raw = self._read_block(REG_FIFO_DATA, bytes_per_sample * num_samples)
+
+        if NUMBA_AVAILABLE and bytes_per_sample == 6:
+            red_led = np.empty(num_samples, dtype=np.uint32)
+            ir_led = np.empty(num_samples, dtype=np.uint32)
+            _unpack_samples(np.frombuffer(raw, dtype=np.uint8), num_samples, red_led, ir_led)
+            return red_led, ir_led
+
+        # one (sample, channel, byte) array; shift, combine and mask MSB [23:18]
+        # each as a single ufunc call over all samples
+        d = np.frombuffer(raw, dtype=np.uint8).reshape(num_samples, -1, 3).astype(np.uint32)
+        np.left_shift(d, _BYTE_SHIFTS, out=d)
+        words = np.bitwise_or.reduce(d, axis=2)
+        np.bitwise_and(words, 0x03FFFF, out=words)
+
+        if bytes_per_sample == 3:
+            # heart rate mode: red only, no ir channel
+            red_led = words[:, 0]
+            return red_led, np.zeros_like(red_led)
+        return words[:, 0], words[:, 1]
+
     def read_sequential(self, amount=100):
         """
         This function will read the red-led and ir-led `amount` times.
@@ -147,13 +274,13 @@ class MAX30102():
         count = amount
         while count > 0:
             num_bytes = self.get_data_present()
-            while num_bytes > 0:
-                red, ir = self.read_fifo()
+            if num_bytes > 0:
+                # drain everything available in one block read
+                red, ir = self.read_fifo_burst(num_bytes)
 
-                red_buf.append(red)
-                ir_buf.append(ir)
-                num_bytes -= 1
-                count -= 1
+                red_buf.extend(red.tolist())
+                ir_buf.extend(ir.tolist())
+                count -= len(ir)
 
         return red_buf, ir_buf
 
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+PPG sample window shared by the MAX30102 readers
+Keeps the most recent samples in fixed-size NumPy ring buffers,
+plus the SPSC ring used to hand data between threads
+"""
+
+import queue
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+
+# Each sample is stored as one uint64: red in bits 24-41, IR in bits 0-17
+RED_SHIFT = 24
+SAMPLE_MASK = 0x3FFFF
+
+
+class PPGWindow:
+    """
+    Sliding window of the most recent raw IR/Red samples.
+    Samples are packed pairwise into a single preallocated uint64 ring
+    buffer and running sums are kept so the window means are O(1).
+    The ring is stored twice back to back, so the current window is
+    always one contiguous slice and reading it never reassembles the
+    two halves.
+    """
+
+    def __init__(self, size: int = 100):
+        """
+        Initialize an empty window
+
+        Args:
+            size: Number of samples kept in the window
+        """
+        self.size = size
+        self._buf = np.zeros(2 * size, dtype=np.uint64)
+        # Output arrays reused by arrays()
+        self._tmp = np.empty(size, dtype=np.uint64)
+        self._ir_out = np.empty(size, dtype=np.int32)
+        self._red_out = np.empty(size, dtype=np.int32)
+        self._widx = 0
+        self.filled = 0
+        self.ir_sum = 0
+        self.red_sum = 0
+
+    def extend(self, red, ir):
+        """Append arrays of new samples, overwriting the oldest ones"""
+        n = len(ir)
+        idx = (self._widx + np.arange(n)) % self.size
+        old = self._buf[idx]
+        # Unfilled slots are zero, so this is also correct while filling up
+        self.ir_sum += int(ir.sum()) - int((old & SAMPLE_MASK).sum())
+        self.red_sum += int(red.sum()) - int(((old >> RED_SHIFT) & SAMPLE_MASK).sum())
+        packed = (red.astype(np.uint64) << RED_SHIFT) | ir.astype(np.uint64)
+        self._buf[idx] = packed
+        self._buf[idx + self.size] = packed
+        self._widx = (self._widx + n) % self.size
+        self.filled = min(self.filled + n, self.size)
+
+    def is_full(self) -> bool:
+        return self.filled == self.size
+
+    @property
+    def ir_mean(self) -> float:
+        return self.ir_sum / self.filled if self.filled else 0.0
+
+    @property
+    def red_mean(self) -> float:
+        return self.red_sum / self.filled if self.filled else 0.0
+
+    def arrays(self):
+        """
+        Return (ir, red) int32 arrays of the window in chronological order.
+        The arrays are reused and overwritten by the next call.
+        """
+        view = self._buf[self._widx:self._widx + self.size]
+        tmp = self._tmp
+        np.bitwise_and(view, SAMPLE_MASK, out=tmp)
+        self._ir_out[:] = tmp
+        np.right_shift(view, RED_SHIFT, out=tmp)
+        np.bitwise_and(tmp, SAMPLE_MASK, out=tmp)
+        self._red_out[:] = tmp
+        return self._ir_out, self._red_out
+
+
+class SPSCRing:
+    """
+    Fixed-capacity single-producer/single-consumer ring of items.
+    The producer only advances head and the consumer only advances tail,
+    so no lock is needed; when full the new item is dropped (and counted
+    in dropped) rather than the producer moving tail.
+    Mirrors the get/get_nowait interface of queue.Queue; after close()
+    a blocking get() returns the None sentinel once the ring is drained.
+    """
+    
+    def __init__(self, capacity: int = 128):
+        # Capacity must be a power of two so indices wrap with a mask
+        self._mask = capacity - 1
+        self._slots = [None] * capacity
+        self._head = 0
+        self._tail = 0
+        self._evt = threading.Event()
+        self._closed = False
+        # items rejected because the ring was full (producer side only)
+        self.dropped = 0
+
+    def put_nowait(self, item) -> bool:
+        """Push an item; returns False and drops it when the ring is full"""
+        head = self._head
+        nxt = (head + 1) & self._mask
+        if nxt == self._tail:
+            self.dropped += 1
+            return False
+        self._slots[head] = item
+        self._head = nxt
+        self._evt.set()
+        return True
+
+    def get_nowait(self):
+        """Pop the oldest item or raise queue.Empty"""
+        tail = self._tail
+        if tail == self._head:
+            raise queue.Empty
+        item = self._slots[tail]
+        self._slots[tail] = None
+        self._tail = (tail + 1) & self._mask
+        return item
+
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        """Pop the oldest item, waiting up to timeout seconds for one"""
+        if not block:
+            return self.get_nowait()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._tail == self._head:
+            self._evt.clear()
+            if self._tail != self._head:
+                break
+            if self._closed:
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty
+            self._evt.wait(remaining)
+        return self.get_nowait()
+
+    def close(self):
+        """Wake a blocked consumer; may be called from any thread"""
+        self._closed = True
+        self._evt.set()
+
+    def empty(self) -> bool:
+        return self._tail == self._head
+
+    def qsize(self) -> int:
+        return (self._head - self._tail) & self._mask
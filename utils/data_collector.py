@@ -4,30 +4,81 @@ Data Collector Module for Music Therapy Box
 Collects and manages sensor data from GSR and Heart Rate sensors
 """
 
+import math
 import time
 import logging
 import threading
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
-from datetime import datetime
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Record layout of the binary sensor log (same bytes as struct '<dffB');
+# read it back with np.fromfile(path, dtype=LOG_RECORD_DTYPE)
+LOG_RECORD_DTYPE = np.dtype([('ts', '<f8'), ('gsr', '<f4'), ('hr', '<f4'), ('valid', 'u1')])
+
+# Bits of the per-reading presence flags kept in the ring buffer
+FLAG_GSR = 1
+FLAG_HR = 2
+
+def _no_reading():
+    """Stand-in read method for a missing sensor"""
+    return None
+
+@dataclass(slots=True, frozen=True)
 class SensorReading:
     gsr_conductance: Optional[float]
     heart_rate: Optional[float]
     timestamp: float
     valid: bool
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DataWindow:
     readings: List[SensorReading]
     start_time: float
     end_time: float
     duration: float
     baseline: Optional[Dict[str, float]] = None
+    # The readings' values as float32 arrays (NaN when missing), for
+    # analysis code that would otherwise rebuild them from the list
+    gsr_array: Optional[np.ndarray] = None
+    hr_array: Optional[np.ndarray] = None
+
+class RunningStats:
+    """
+    Running mean/std/min/max of a stream, updated in O(1) per value
+    with Welford's algorithm
+    """
+    
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """Forget every value seen so far"""
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def add(self, x: float):
+        """Fold one value into the statistics"""
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+    
+    @property
+    def std(self) -> float:
+        """Population standard deviation (as np.std)"""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
 
 class DataCollector:
     """
@@ -45,24 +96,50 @@ class DataCollector:
         self.sampling_rate = sampling_rate
         self.sample_interval = 1.0 / sampling_rate
         
-        # Data storage
-        self.readings_buffer = []
+        # Data storage: preallocated ring of the most recent readings with
+        # one array per field (structure of arrays); missing values are NaN
         self.max_buffer_size = 10000
+        self._gsr = np.full(self.max_buffer_size, np.nan, dtype=np.float32)
+        self._hr = np.full(self.max_buffer_size, np.nan, dtype=np.float32)
+        self._ts = np.zeros(self.max_buffer_size, dtype=np.float64)
+        # FLAG_GSR/FLAG_HR bits of the values present; zero means invalid
+        self._flags = np.zeros(self.max_buffer_size, dtype=np.uint8)
+        # Single-producer ring: _seq counts every reading ever written and is
+        # only advanced (by the sampling thread) after the slot is filled, so
+        # readers snapshot it first and never need a lock
+        self._seq = 0
+        # Statistics over every reading recorded since the last reset
+        self._gsr_stats = RunningStats()
+        self._hr_stats = RunningStats()
+        # Sample ticks skipped because neither sensor returned a value
+        self.missing_samples = 0
         
         # Collection state
         self.collecting = False
         self._stop_event = threading.Event()
+        # Set on shutdown to cancel a collection in progress
+        self._close_event = threading.Event()
         self._collection_thread = None
         
+        # Sensor log: a writer thread drains the ring into a file that is
+        # opened on first write and kept open, so sampling never waits on IO
+        self._log_fh = None
+        self._log_thread = None
+        self._log_stop = threading.Event()
+        self._log_lock = threading.Lock()  # serialises ring consumers of the log
+        self._logged_seq = 0
+        
         # Configuration
         self.config = {
             'log_data': True,
             'log_file': 'sensor_data.txt',
+            'log_format': 'text',  # 'text' rows or 'binary' LOG_RECORD_DTYPE records
             'min_valid_readings': 5,  # Minimum valid readings for analysis
             'max_missing_samples': 3  # Maximum consecutive missing samples
         }
 
-    def collect_baseline(self, gsr_sensor, hr_sensor, duration: int = 10) -> Optional[List[SensorReading]]:
+    def collect_baseline(self, gsr_sensor, hr_sensor, duration: int = 10,
+                         return_arrays: bool = False) -> Optional[Union[List[SensorReading], Dict[str, np.ndarray]]]:
         """
         Collect baseline data for calibration
         
@@ -70,49 +147,24 @@ class DataCollector:
             gsr_sensor: GSR sensor instance
             hr_sensor: Heart rate sensor instance
             duration: Duration in seconds
+            return_arrays: Return the samples as arrays instead of objects
             
         Returns:
-            List of sensor readings or None if failed
+            List of sensor readings (or, with return_arrays, a dictionary of
+            'gsr', 'hr', 'ts' and 'flags' arrays) or None if failed
         """
         try:
-            logger.info(f"Starting baseline data collection for {duration} seconds...")
+            logger.info("Starting baseline data collection for %s seconds...", duration)
             
-            readings = []
-            start_time = time.time()
-            last_sample_time = start_time
+            start, end = self._collect(gsr_sensor, hr_sensor, duration)
+            readings = self._collected(start, end, return_arrays)
             
-            while time.time() - start_time < duration:
-                current_time = time.time()
-                
-                # Ensure we don't sample too frequently
-                if current_time - last_sample_time >= self.sample_interval:
-                    # Collect sensor readings
-                    gsr_reading = gsr_sensor.read_gsr() if gsr_sensor else None
-                    hr_reading = hr_sensor.read_max30106_HR() if hr_sensor else None
-                    
-                    # Create reading object
-                    reading = SensorReading(
-                        gsr_conductance=gsr_reading,
-                        heart_rate=hr_reading,
-                        timestamp=current_time,
-                        valid=(gsr_reading is not None or hr_reading is not None)
-                    )
-                    
-                    readings.append(reading)
-                    
-                    # Log data if enabled
-                    if self.config['log_data']:
-                        self._log_reading(reading)
-                    
-                    last_sample_time = current_time
-                
-                time.sleep(0.01)  # Small delay to prevent CPU spinning
-            
-            logger.info(f"Baseline collection completed: {len(readings)} readings collected")
+            logger.info("Baseline collection completed: %d readings collected",
+                        len(readings['ts'] if return_arrays else readings))
             return readings
             
         except Exception as e:
-            logger.error(f"Baseline data collection failed: {e}")
+            logger.error("Baseline data collection failed: %s", e)
             return None
 
     def collect_window(self, gsr_sensor, hr_sensor, window_size: int, 
@@ -130,63 +182,42 @@ class DataCollector:
             DataWindow object or None if failed
         """
         try:
-            logger.info(f"Collecting sensor data window ({window_size}s)...")
+            logger.info("Collecting sensor data window (%ss)...", window_size)
             
-            readings = []
             start_time = time.time()
-            last_sample_time = start_time
-            
-            while time.time() - start_time < window_size:
-                current_time = time.time()
-                
-                # Ensure we don't sample too frequently
-                if current_time - last_sample_time >= self.sample_interval:
-                    # Collect sensor readings
-                    gsr_reading = gsr_sensor.read_gsr() if gsr_sensor else None
-                    hr_reading = hr_sensor.read_max30106_HR() if hr_sensor else None
-                    
-                    # Create reading object
-                    reading = SensorReading(
-                        gsr_conductance=gsr_reading,
-                        heart_rate=hr_reading,
-                        timestamp=current_time,
-                        valid=(gsr_reading is not None or hr_reading is not None)
-                    )
-                    
-                    readings.append(reading)
-                    last_sample_time = current_time
-                
-                time.sleep(0.01)  # Small delay to prevent CPU spinning
-            
+            start, end = self._collect(gsr_sensor, hr_sensor, window_size)
             end_time = time.time()
             
+            gsr, hr, ts, flags = self._slice(start, end)
+            
             # Create data window
             window = DataWindow(
-                readings=readings,
+                readings=self._to_readings(gsr, hr, ts, flags),
                 start_time=start_time,
                 end_time=end_time,
                 duration=end_time - start_time,
-                baseline=baseline
+                baseline=baseline,
+                # Copies: the ring slots get reused once the ring wraps
+                gsr_array=gsr.copy(),
+                hr_array=hr.copy()
             )
             
-            # Calculate statistics
-            valid_readings = [r for r in readings if r.valid]
-            gsr_readings = [r for r in readings if r.gsr_conductance is not None]
-            hr_readings = [r for r in readings if r.heart_rate is not None]
-            
-            logger.info(f"Data window collected: {len(readings)} readings over {window.duration:.1f}s")
-            logger.info(f"Valid readings: {len(valid_readings)}")
-            logger.info(f"GSR readings: {len(gsr_readings)}")
-            logger.info(f"HR readings: {len(hr_readings)}")
+            # Calculate statistics (only when they will be logged)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Data window collected: %d readings over %.1fs", len(ts), window.duration)
+                logger.info("Valid readings: %d", np.count_nonzero(flags))
+                logger.info("GSR readings: %d", np.count_nonzero(flags & FLAG_GSR))
+                logger.info("HR readings: %d", np.count_nonzero(flags & FLAG_HR))
             
             return window
             
         except Exception as e:
-            logger.error(f"Data window collection failed: {e}")
+            logger.error("Data window collection failed: %s", e)
             return None
 
     def collect_quick_sample(self, gsr_sensor, hr_sensor, duration: int = 10,
-                           baseline: Optional[Dict[str, float]] = None) -> Optional[List[SensorReading]]:
+                           baseline: Optional[Dict[str, float]] = None,
+                           return_arrays: bool = False) -> Optional[Union[List[SensorReading], Dict[str, np.ndarray]]]:
         """
         Collect a quick sample of sensor data
         
@@ -195,48 +226,149 @@ class DataCollector:
             hr_sensor: Heart rate sensor instance
             duration: Duration in seconds
             baseline: Baseline data for normalization
+            return_arrays: Return the samples as arrays instead of objects
             
         Returns:
-            List of sensor readings or None if failed
+            List of sensor readings (or, with return_arrays, a dictionary of
+            'gsr', 'hr', 'ts' and 'flags' arrays) or None if failed
         """
         try:
-            logger.info(f"Collecting quick sample ({duration}s)...")
-            
-            readings = []
-            start_time = time.time()
-            last_sample_time = start_time
+            logger.info("Collecting quick sample (%ss)...", duration)
             
-            while time.time() - start_time < duration:
-                current_time = time.time()
-                
-                # Ensure we don't sample too frequently
-                if current_time - last_sample_time >= self.sample_interval:
-                    # Collect sensor readings
-                    gsr_reading = gsr_sensor.read_gsr() if gsr_sensor else None
-                    hr_reading = hr_sensor.read_max30106_HR() if hr_sensor else None
-                    
-                    # Create reading object
-                    reading = SensorReading(
-                        gsr_conductance=gsr_reading,
-                        heart_rate=hr_reading,
-                        timestamp=current_time,
-                        valid=(gsr_reading is not None or hr_reading is not None)
-                    )
-                    
-                    readings.append(reading)
-                    last_sample_time = current_time
-                
-                time.sleep(0.01)  # Small delay to prevent CPU spinning
+            start, end = self._collect(gsr_sensor, hr_sensor, duration)
+            readings = self._collected(start, end, return_arrays)
             
-            logger.info(f"Quick sample collected: {len(readings)} readings")
+            logger.info("Quick sample collected: %d readings",
+                        len(readings['ts'] if return_arrays else readings))
             return readings
             
         except Exception as e:
-            logger.error(f"Quick sample collection failed: {e}")
+            logger.error("Quick sample collection failed: %s", e)
             return None
 
-    def start_continuous_collection(self):
-        """Start continuous data collection in background thread"""
+    def _collected(self, start: int, end: int, return_arrays: bool):
+        """SensorReading list, or dictionary of array copies, for [start, end)"""
+        gsr, hr, ts, flags = self._slice(start, end)
+        if return_arrays:
+            # Copies: the ring slots get reused once the ring wraps
+            return {'gsr': gsr.copy(), 'hr': hr.copy(), 'ts': ts.copy(), 'flags': flags.copy()}
+        return self._to_readings(gsr, hr, ts, flags)
+
+    def _collect(self, gsr_sensor, hr_sensor, duration: float) -> Tuple[int, int]:
+        """
+        Record `duration` seconds of readings into the ring buffer
+        
+        While continuous collection runs its thread stays the ring's only
+        producer and this just waits for it to record the readings.
+        
+        Returns:
+            (start, end) sequence numbers of the recorded readings
+        """
+        if self.collecting:
+            start = self._seq
+            self._close_event.wait(duration)
+            span = start, self._seq
+        else:
+            span = self._sample_loop(gsr_sensor, hr_sensor, duration)
+        if self.config['log_data']:
+            # Sampling is over, so the log can be brought up to date here
+            self._flush_log()
+        return span
+
+    def _sample_loop(self, gsr_sensor, hr_sensor, duration: float,
+                     stop: Optional[threading.Event] = None) -> Tuple[int, int]:
+        """
+        Sample both sensors every sample_interval for `duration` seconds
+        straight into the ring buffer
+        
+        Args:
+            gsr_sensor: GSR sensor instance (or None)
+            hr_sensor: Heart rate sensor instance (or None)
+            duration: Duration in seconds
+            stop: Event that ends the loop early (defaults to the close event)
+            
+        Returns:
+            (start, end) sequence numbers of the recorded readings
+            (at most max_buffer_size of them are kept)
+        """
+        if self.config['log_data']:
+            self._start_log_thread()
+        
+        # Resolve the read methods once instead of testing the sensors every tick
+        gsr_read = gsr_sensor.read_gsr if gsr_sensor else _no_reading
+        hr_read = hr_sensor.read_max30106_HR if hr_sensor else _no_reading
+        
+        # Hoist everything the loop touches per sample into locals
+        _time = time.time
+        wait = (stop or self._close_event).wait
+        gsr_buf, hr_buf, ts_buf, flags_buf = self._gsr, self._hr, self._ts, self._flags
+        size = self.max_buffer_size
+        nan = np.nan
+        gsr_add = self._gsr_stats.add
+        hr_add = self._hr_stats.add
+        
+        start_time = _time()
+        interval = self.sample_interval
+        start = seq = self._seq
+        max_missing = self.config['max_missing_samples']
+        missing = 0
+        k = 1
+        
+        while k * interval < duration:
+            # Block until the k-th scheduled sample; close() cancels the wait
+            current_time = _time()
+            delay = start_time + k * interval - current_time
+            if delay > 0:
+                if wait(delay):
+                    break
+                current_time = _time()
+            
+            # Next tick after now, skipping any missed while a read was slow
+            k = max(k + 1, int((current_time - start_time) / interval) + 1)
+            
+            # Collect sensor readings
+            gsr_reading = gsr_read()
+            hr_reading = hr_read()
+            
+            # Nothing to record or log while both sensors are silent
+            if gsr_reading is None and hr_reading is None:
+                missing += 1
+                self.missing_samples += 1
+                if missing == max_missing + 1:
+                    logger.warning("No sensor data for %d consecutive samples", missing)
+                continue
+            if missing > max_missing:
+                logger.info("Sensor data resumed after %d missing samples", missing)
+            missing = 0
+            
+            if gsr_reading is not None:
+                gsr_add(gsr_reading)
+            if hr_reading is not None:
+                hr_add(hr_reading)
+            
+            # Same as _record, inlined
+            i = seq % size
+            gsr_buf[i] = nan if gsr_reading is None else gsr_reading
+            hr_buf[i] = nan if hr_reading is None else hr_reading
+            ts_buf[i] = current_time
+            flags_buf[i] = (gsr_reading is not None) | ((hr_reading is not None) << 1)
+            seq += 1
+            self._seq = seq  # publish only after the slot is written
+        
+        return start, seq
+
+    def start_continuous_collection(self, gsr_sensor=None, hr_sensor=None):
+        """
+        Start continuous data collection in background thread
+        
+        The thread samples the given sensors into the ring buffer until
+        stop_continuous_collection(); collections started meanwhile read
+        from the ring instead of sampling the sensors themselves.
+        
+        Args:
+            gsr_sensor: GSR sensor instance
+            hr_sensor: Heart rate sensor instance
+        """
         if self.collecting:
             logger.warning("Data collection already running")
             return
@@ -244,13 +376,14 @@ class DataCollector:
         try:
             self.collecting = True
             self._stop_event.clear()
-            self._collection_thread = threading.Thread(target=self._continuous_collection, daemon=True)
+            self._collection_thread = threading.Thread(target=self._continuous_collection,
+                                                       args=(gsr_sensor, hr_sensor), daemon=True)
             self._collection_thread.start()
             
             logger.info("Continuous data collection started")
             
         except Exception as e:
-            logger.error(f"Failed to start continuous collection: {e}")
+            logger.error("Failed to start continuous collection: %s", e)
             self.collecting = False
 
     def stop_continuous_collection(self):
@@ -265,27 +398,88 @@ class DataCollector:
             if self._collection_thread and self._collection_thread.is_alive():
                 self._collection_thread.join(timeout=2.0)
             
+            self._flush_log()
+            
             logger.info("Continuous data collection stopped")
             
         except Exception as e:
-            logger.error(f"Failed to stop continuous collection: {e}")
+            logger.error("Failed to stop continuous collection: %s", e)
 
-    def _continuous_collection(self):
+    def _continuous_collection(self, gsr_sensor, hr_sensor):
         """Background thread for continuous data collection"""
         logger.info("Continuous data collection thread started")
         
-        while not self._stop_event.is_set() and self.collecting:
+        # The sample loop waits on the stop event, so stop_continuous_collection
+        # ends it at once; it only returns early when a sensor read raises
+        stop_wait = self._stop_event.wait
+        while not self._stop_event.is_set():
             try:
-                # This would collect data continuously
-                # For now, just sleep to prevent CPU spinning
-                time.sleep(self.sample_interval)
+                self._sample_loop(gsr_sensor, hr_sensor, math.inf, stop=self._stop_event)
                 
             except Exception as e:
-                logger.error(f"Error in continuous collection: {e}")
-                time.sleep(1)
+                logger.error("Error in continuous collection: %s", e)
+                stop_wait(1)
         
         logger.info("Continuous data collection thread stopped")
 
+    def add_reading(self, reading: SensorReading):
+        """
+        Store a reading in the ring buffer, overwriting the oldest when full;
+        a reading marked invalid is stored without its values
+        """
+        self._record(reading.gsr_conductance, reading.heart_rate, reading.timestamp, reading.valid)
+
+    def _record(self, gsr: Optional[float], hr: Optional[float], timestamp: float, valid: bool = True):
+        """Write one sample into the ring buffer (producer side only)"""
+        if not valid:
+            gsr = hr = None
+        seq = self._seq
+        i = seq % self.max_buffer_size
+        self._gsr[i] = np.nan if gsr is None else gsr
+        self._hr[i] = np.nan if hr is None else hr
+        self._ts[i] = timestamp
+        self._flags[i] = (gsr is not None) | ((hr is not None) << 1)
+        if gsr is not None:
+            self._gsr_stats.add(gsr)
+        if hr is not None:
+            self._hr_stats.add(hr)
+        self._seq = seq + 1
+
+    def _slice(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (gsr, hr, ts, flags) of readings with sequence numbers in
+        [start, end), oldest first; readings already overwritten are skipped.
+        Unless the range wraps around the ring the arrays are views into it
+        """
+        size = self.max_buffer_size
+        start = max(start, end - size, 0)
+        i = start % size
+        j = i + (end - start)
+        if j <= size:
+            # Contiguous in the ring: plain slices are views, nothing is copied
+            return self._gsr[i:j], self._hr[i:j], self._ts[i:j], self._flags[i:j]
+        # Wrapped: join the tail and head segments
+        j -= size
+        return tuple(np.concatenate((a[i:], a[:j]))
+                     for a in (self._gsr, self._hr, self._ts, self._flags))
+
+    def _ordered(self, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return (gsr, hr, ts, flags) of the last count readings, oldest first"""
+        end = self._seq
+        return self._slice(end - count, end)
+
+    @staticmethod
+    def _to_readings(gsr, hr, ts, flags) -> List[SensorReading]:
+        """
+        Build SensorReading objects from ring arrays (missing values become
+        None); only done when a caller asks for objects, never per sample
+        """
+        # Positional arguments: this is the one place readings are built in bulk
+        return [
+            SensorReading(g if f & FLAG_GSR else None, h if f & FLAG_HR else None, t, f != 0)
+            for g, h, t, f in zip(gsr.tolist(), hr.tolist(), ts.tolist(), flags.tolist())
+        ]
+
     def get_recent_readings(self, count: int = 100) -> List[SensorReading]:
         """
         Get recent sensor readings
@@ -296,7 +490,24 @@ class DataCollector:
         Returns:
             List of recent SensorReading objects
         """
-        return self.readings_buffer[-count:] if self.readings_buffer else []
+        return self._to_readings(*self._ordered(count))
+
+    def get_recent_arrays(self, count: int = 100) -> Dict[str, np.ndarray]:
+        """
+        Get recent sensor readings as arrays
+        
+        The arrays are usually views into the ring buffer and stay valid
+        until max_buffer_size more readings are recorded; copy them to keep.
+        
+        Args:
+            count: Number of recent readings to return
+            
+        Returns:
+            Dictionary of 'gsr', 'hr' (NaN when missing), 'ts' and 'flags'
+            (FLAG_GSR/FLAG_HR bits, 0 = invalid) arrays, oldest first
+        """
+        gsr, hr, ts, flags = self._ordered(count)
+        return {'gsr': gsr, 'hr': hr, 'ts': ts, 'flags': flags}
 
     def get_readings_in_timeframe(self, duration_seconds: int) -> List[SensorReading]:
         """
@@ -308,74 +519,207 @@ class DataCollector:
         Returns:
             List of SensorReading objects within timeframe
         """
-        if not self.readings_buffer:
-            return []
+        arrays = self.get_arrays_in_timeframe(duration_seconds)
+        return self._to_readings(arrays['gsr'], arrays['hr'], arrays['ts'], arrays['flags'])
+
+    def get_arrays_in_timeframe(self, duration_seconds: float) -> Dict[str, np.ndarray]:
+        """
+        Get readings from the last N seconds as arrays
+        
+        Like get_recent_arrays() the arrays are usually views into the ring.
         
+        Args:
+            duration_seconds: Time window in seconds
+            
+        Returns:
+            Dictionary of 'gsr', 'hr' (NaN when missing), 'ts' and 'flags'
+            (FLAG_GSR/FLAG_HR bits, 0 = invalid) arrays, oldest first
+        """
         cutoff_time = time.time() - duration_seconds
-        return [r for r in self.readings_buffer if r.timestamp >= cutoff_time]
+        end = self._seq
+        head = end % self.max_buffer_size
+        # Timestamps increase in write order, so binary search each of the
+        # two ring segments: [head:] holds the older half once wrapped
+        newer = self._ts[:head]
+        older = self._ts[head:min(end, self.max_buffer_size)]
+        if len(older) and older[-1] >= cutoff_time:
+            n = len(older) - int(np.searchsorted(older, cutoff_time, side='left')) + head
+        else:
+            n = head - int(np.searchsorted(newer, cutoff_time, side='left'))
+        gsr, hr, ts, flags = self._slice(end - n, end)
+        return {'gsr': gsr, 'hr': hr, 'ts': ts, 'flags': flags}
 
-    def calculate_statistics(self, readings: List[SensorReading]) -> Dict[str, float]:
+    def calculate_statistics(self, readings: Optional[List[SensorReading]] = None,
+                             count: Optional[int] = None) -> Dict[str, float]:
         """
         Calculate statistics for a set of readings
         
         Args:
-            readings: List of sensor readings
+            readings: List of sensor readings; when omitted the last `count`
+                readings in the ring buffer are used (all of them if None)
+            count: Number of recent buffered readings to use
             
         Returns:
             Dictionary with statistical measures
         """
-        if not readings:
+        if readings is None:
+            gsr, hr, _, flags = self._ordered(self.max_buffer_size if count is None else count)
+        else:
+            # One pass into arrays; invalid readings count as missing
+            n = len(readings)
+            gsr = np.fromiter((r.gsr_conductance if r.valid and r.gsr_conductance is not None
+                               else np.nan for r in readings), dtype=np.float64, count=n)
+            hr = np.fromiter((r.heart_rate if r.valid and r.heart_rate is not None
+                              else np.nan for r in readings), dtype=np.float64, count=n)
+            flags = np.fromiter(((r.gsr_conductance is not None) | ((r.heart_rate is not None) << 1)
+                                 if r.valid else 0 for r in readings), dtype=np.uint8, count=n)
+        return self._array_statistics(gsr, hr, flags)
+
+    def get_running_statistics(self) -> Dict[str, float]:
+        """
+        Statistics over all readings recorded since the last reset, kept up
+        to date as readings arrive so this is O(1) regardless of how many
+        there are (and includes readings that left the ring buffer)
+        
+        Returns:
+            Dictionary with the same GSR/HR keys as calculate_statistics
+        """
+        stats = {}
+        for name, rs in (('gsr', self._gsr_stats), ('hr', self._hr_stats)):
+            if rs.count:
+                stats.update({
+                    f'{name}_mean': rs.mean,
+                    f'{name}_std': rs.std,
+                    f'{name}_min': rs.min,
+                    f'{name}_max': rs.max
+                })
+        return stats
+
+    def reset_running_statistics(self):
+        """Start the running statistics afresh"""
+        # Reset in place: a running sampling loop holds the bound add methods
+        self._gsr_stats.reset()
+        self._hr_stats.reset()
+
+    @staticmethod
+    def _array_statistics(gsr: np.ndarray, hr: np.ndarray, flags: np.ndarray) -> Dict[str, float]:
+        """Statistics over gsr/hr arrays where NaN marks a missing value"""
+        n = len(flags)
+        if not n:
             return {}
         
-        # Separate valid readings
-        valid_readings = [r for r in readings if r.valid]
+        # Counts and presence come from the flag bytes, not from NaN tests
+        valid = int(np.count_nonzero(flags))
+        present = int(np.bitwise_or.reduce(flags))
         
-        if not valid_readings:
+        if not valid:
             return {'count': 0, 'error': 'No valid readings'}
         
-        # Extract values
-        gsr_values = [r.gsr_conductance for r in valid_readings if r.gsr_conductance is not None]
-        hr_values = [r.heart_rate for r in valid_readings if r.heart_rate is not None]
-        
         stats = {
-            'count': len(valid_readings),
-            'valid_rate': len(valid_readings) / len(readings) if readings else 0.0
+            'count': valid,
+            'valid_rate': valid / n
         }
         
+        # The nan-aware reductions skip missing values without a masked copy
         # GSR statistics
-        if gsr_values:
+        if present & FLAG_GSR:
             stats.update({
-                'gsr_mean': np.mean(gsr_values),
-                'gsr_std': np.std(gsr_values),
-                'gsr_min': np.min(gsr_values),
-                'gsr_max': np.max(gsr_values)
+                'gsr_mean': float(np.nanmean(gsr, dtype=np.float64)),
+                'gsr_std': float(np.nanstd(gsr, dtype=np.float64)),
+                'gsr_min': float(np.nanmin(gsr)),
+                'gsr_max': float(np.nanmax(gsr))
             })
         
         # Heart rate statistics
-        if hr_values:
+        if present & FLAG_HR:
             stats.update({
-                'hr_mean': np.mean(hr_values),
-                'hr_std': np.std(hr_values),
-                'hr_min': np.min(hr_values),
-                'hr_max': np.max(hr_values)
+                'hr_mean': float(np.nanmean(hr, dtype=np.float64)),
+                'hr_std': float(np.nanstd(hr, dtype=np.float64)),
+                'hr_min': float(np.nanmin(hr)),
+                'hr_max': float(np.nanmax(hr))
             })
         
         return stats
 
-    def _log_reading(self, reading: SensorReading):
-        """Log sensor reading to file"""
-        try:
-            with open(self.config['log_file'], "a") as f:
-                timestamp_str = datetime.fromtimestamp(reading.timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                gsr_str = f"{reading.gsr_conductance:.2f}" if reading.gsr_conductance is not None else "None"
-                hr_str = f"{reading.heart_rate:.1f}" if reading.heart_rate is not None else "None"
-                f.write(f"{timestamp_str},{gsr_str},{hr_str},{reading.valid}\n")
-        except Exception as e:
-            logger.warning(f"Failed to log sensor reading: {e}")
+    def _start_log_thread(self):
+        """Start the log writer thread if it is not running"""
+        if self._log_thread is None or not self._log_thread.is_alive():
+            self._log_stop.clear()
+            self._log_thread = threading.Thread(target=self._run_log_writer, daemon=True)
+            self._log_thread.start()
 
-    def __del__(self):
-        """Cleanup when object is destroyed"""
+    def _run_log_writer(self):
+        """Write new ring readings to the sensor log (runs in background thread)"""
+        while not self._log_stop.wait(0.1):
+            self._write_log()
+        self._flush_log()
+
+    def _write_log(self):
+        """
+        Append readings recorded since the last call to the sensor log
+        
+        Text rows are epoch_seconds,gsr,hr,valid with nan for a missing
+        value; binary records hold the same fields as LOG_RECORD_DTYPE.
+        Both are buffered and reach the file on flush or close
+        """
+        with self._log_lock:
+            end = self._seq
+            if end == self._logged_seq:
+                return
+            gsr, hr, ts, flags = self._slice(self._logged_seq, end)
+            valid = flags != 0
+            self._logged_seq = end
+            try:
+                if self._log_fh is None:
+                    self._log_fh = open(self.config['log_file'], "ab", buffering=1 << 16)
+                if self.config['log_format'] == 'binary':
+                    records = np.empty(len(ts), dtype=LOG_RECORD_DTYPE)
+                    records['ts'] = ts
+                    records['gsr'] = gsr
+                    records['hr'] = hr
+                    records['valid'] = valid
+                    self._log_fh.write(records.tobytes())
+                else:
+                    self._log_fh.write(b"".join([
+                        b"%.6f,%.2f,%.1f,%d\n" % row
+                        for row in zip(ts.tolist(), gsr.tolist(), hr.tolist(), valid.tolist())
+                    ]))
+            except Exception as e:
+                logger.warning("Failed to log sensor reading: %s", e)
+
+    def _flush_log(self):
+        """Write pending readings and push buffered log rows to the file"""
+        self._write_log()
+        with self._log_lock:
+            if self._log_fh is not None:
+                try:
+                    self._log_fh.flush()
+                except Exception as e:
+                    logger.warning("Failed to flush sensor log: %s", e)
+
+    def close(self):
+        """
+        Stop collection, finish the sensor log and close it
+        
+        Cancels any collection in progress. Also runs on leaving a
+        `with DataCollector() as collector:` block.
+        """
+        self._close_event.set()
         self.stop_continuous_collection()
+        self._log_stop.set()
+        if self._log_thread is not None:
+            self._log_thread.join(timeout=1.0)
+        self._flush_log()
+        with self._log_lock:
+            if self._log_fh is not None:
+                self._log_fh.close()
+                self._log_fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 # Standalone testing function
 def test_data_collector(duration: int = 30):
@@ -408,11 +752,11 @@ def test_data_collector(duration: int = 30):
                 valid=True
             )
             
-            collector.readings_buffer.append(reading)
+            collector.add_reading(reading)
             
             # Calculate statistics every 10 readings
             if test_count % 10 == 0:
-                stats = collector.calculate_statistics(collector.get_recent_readings(10))
+                stats = collector.calculate_statistics(count=10)
                 print(f"Sample {test_count}: GSR={stats.get('gsr_mean', 0):.1f}μS, HR={stats.get('hr_mean', 0):.1f}BPM")
             
             time.sleep(1)
@@ -422,12 +766,13 @@ def test_data_collector(duration: int = 30):
     
     finally:
         # Show final statistics
-        final_stats = collector.calculate_statistics(collector.get_recent_readings())
+        final_stats = collector.calculate_statistics(count=100)
         print(f"\nFinal Statistics:")
         print(f"  Total readings: {final_stats.get('count', 0)}")
         print(f"  Valid rate: {final_stats.get('valid_rate', 0):.2f}")
         print(f"  GSR mean: {final_stats.get('gsr_mean', 0):.1f}μS")
         print(f"  HR mean: {final_stats.get('hr_mean', 0):.1f}BPM")
+        collector.close()
         print('Data collector test completed!')
 
 if __name__ == "__main__":
@@ -5,15 +5,146 @@ Extracts the exact 15 features required by the Random Forest model
 """
 
 import time
+import atexit
 import logging
 import numpy as np
-from scipy import stats
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
+from enum import IntEnum
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # numba is optional; without it the statistics use NumPy reductions
+    NUMBA_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+_EPS = np.finfo(np.float64).eps
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _basic_stats(a):
+        """Return (mean, std with ddof=1, min, max) of a in one pass (Welford)"""
+        n = a.size
+        mean = 0.0
+        m2 = 0.0
+        amin = a[0]
+        amax = a[0]
+        for i in range(n):
+            x = a[i]
+            delta = x - mean
+            mean += delta / (i + 1)
+            m2 += delta * (x - mean)
+            if x < amin:
+                amin = x
+            elif x > amax:
+                amax = x
+        std = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+        return mean, std, amin, amax
+
+    @njit(cache=True)
+    def _shape_stats(a, mean):
+        """Return the biased (skew, Fisher kurtosis) of a, as scipy.stats defaults"""
+        n = a.size
+        m2 = 0.0
+        m3 = 0.0
+        m4 = 0.0
+        for i in range(n):
+            d = a[i] - mean
+            d2 = d * d
+            m2 += d2
+            m3 += d2 * d
+            m4 += d2 * d2
+        m2 /= n
+        # Same "nearly constant" cut-off as scipy, which reports NaN there
+        if m2 <= (_EPS * mean) ** 2:
+            return np.nan, np.nan
+        return (m3 / n) / m2 ** 1.5, (m4 / n) / (m2 * m2) - 3.0
+
+    @njit(cache=True)
+    def _dot(x, a):
+        s = 0.0
+        for i in range(a.size):
+            s += x[i] * a[i]
+        return s
+
+    _kernel = njit(cache=True)
+else:
+    def _basic_stats(a):
+        """Return (mean, std with ddof=1, min, max) of a"""
+        n = a.size
+        mean = a.mean()
+        d = a - mean
+        std = np.sqrt(np.dot(d, d) / (n - 1)) if n > 1 else np.nan
+        return mean, std, a.min(), a.max()
+
+    def _shape_stats(a, mean):
+        """Return the biased (skew, Fisher kurtosis) of a, as scipy.stats defaults"""
+        d = a - mean
+        d2 = d * d
+        m2 = d2.mean()
+        # Same "nearly constant" cut-off as scipy, which reports NaN there
+        if m2 <= (_EPS * mean) ** 2:
+            return np.nan, np.nan
+        return np.dot(d2, d) / a.size / m2 ** 1.5, np.dot(d2, d2) / a.size / (m2 * m2) - 3.0
+
+    _dot = np.dot
+
+    def _kernel(func):
+        return func
+
+
+@_kernel
+def _hr_kernel(a):
+    """Return the 7 HR features of a in feature-name order"""
+    mean, std, amin, amax = _basic_stats(a)
+    skew, kurt = _shape_stats(a, mean)
+    return mean, std, amin, amax, amax - amin, skew, kurt
+
+
+@_kernel
+def _eda_kernel(a, x, sxx, fs):
+    """
+    Return the 8 EDA features of a in feature-name order.
+    x is the centred sample index and sxx its sum of squares; the slope
+    is 0 for fewer than two samples.
+    """
+    mean, std, amin, amax = _basic_stats(a)
+    skew, kurt = _shape_stats(a, mean)
+    slope = _dot(x, a) / sxx * fs if a.size >= 2 else 0.0
+    return mean, std, amin, amax, amax - amin, skew, kurt, slope
+
+
+if NUMBA_AVAILABLE:
+    # Compile (or load from cache) now rather than on the first real window
+    _hr_kernel(np.zeros(2))
+    _eda_kernel(np.zeros(2), np.array([-0.5, 0.5]), 0.5, 1.0)
+
+
+class Feature(IntEnum):
+    """Position of each model feature in the feature array"""
+    HR_MEAN = 0
+    HR_STD = 1
+    HR_MIN = 2
+    HR_MAX = 3
+    HR_RANGE = 4
+    HR_SKEW = 5
+    HR_KURTOSIS = 6
+    EDA_MEAN = 7
+    EDA_STD = 8
+    EDA_MIN = 9
+    EDA_MAX = 10
+    EDA_RANGE = 11
+    EDA_SKEW = 12
+    EDA_KURTOSIS = 13
+    EDA_SLOPE = 14
+
+NUM_FEATURES = len(Feature)
+
+@dataclass(slots=True)
 class ExtractedFeatures:
     features: Dict[str, float]
     timestamp: float
@@ -37,6 +168,49 @@ class FeatureExtractor:
             'log_features': True,
             'log_file': 'extracted_features.txt'
         }
+        
+        # Settings used on every window are resolved from config into
+        # attributes; change them through configure(), since edits made
+        # directly to self.config are not picked up
+        self._resolve_config()
+        
+        # Last readings list and its features, for repeated calls on the same window
+        self._last_sig = None
+        self._last_values = None
+        
+        # Centred sample index and its sum of squares for the EDA slope, keyed by length
+        self._x_cache = {}
+        
+        # Feature log, opened on first use and kept open
+        self._log_fh = None
+        self._last_tsec = None
+        self._last_tstr = ""
+        # One log line's worth of "name:value" fields, formatted in a single % operation
+        self._fmt = ",".join(f"{k}:%.3f" for k in self.all_features) + "\n"
+
+    def configure(self, **settings):
+        """
+        Update config entries and re-resolve the settings derived from them
+        
+        Args:
+            **settings: New values for existing config keys
+        """
+        unknown = set(settings) - set(self.config)
+        if unknown:
+            raise ValueError(f"Unknown feature extractor settings: {sorted(unknown)}")
+        self.config.update(settings)
+        self._resolve_config()
+        # Results and the open log may depend on the old values
+        self._last_sig = None
+        self._last_values = None
+        if 'log_file' in settings:
+            self.close()
+
+    def _resolve_config(self):
+        """Copy the per-window settings out of config into attributes"""
+        self.min_samples = self.config['min_samples']
+        self.eda_fs = float(self.config['eda_fs'])
+        self.log_features_enabled = self.config['log_features']
 
     def extract_features(self, data_window) -> Optional[Dict[str, float]]:
         """
@@ -48,113 +222,162 @@ class FeatureExtractor:
         Returns:
             Dictionary with the 15 required features or None if failed
         """
+        values = self.extract_feature_array(data_window)
+        if values is None:
+            return None
+        return dict(zip(self.all_features, values.tolist()))
+
+    def extract_feature_array(self, data_window) -> Optional[np.ndarray]:
+        """
+        Extract the 15 features as a float64 array
+        
+        Args:
+            data_window: DataWindow object containing sensor readings
+            
+        Returns:
+            Array in get_feature_names() order (indexed by Feature) or None if failed
+        """
         try:
             if not data_window or not data_window.readings:
                 logger.warning("No data available for feature extraction")
                 return None
             
             readings = data_window.readings
-            valid_readings = [r for r in readings if r.valid]
             
-            if len(valid_readings) < self.config['min_samples']:
-                logger.warning(f"Insufficient valid readings: {len(valid_readings)} (need at least {self.config['min_samples']})")
+            # Same list with nothing appended since the last call: reuse the
+            # result. The list itself is kept in the signature so its id
+            # cannot be recycled while cached.
+            sig = (readings, len(readings), readings[-1].timestamp)
+            last = self._last_sig
+            if last is not None and last[0] is readings and last[1:] == sig[1:]:
+                return self._last_values.copy()
+            
+            # Separate GSR and HR data, straight from the window's arrays
+            # when the collector attached them
+            if data_window.gsr_array is not None and data_window.hr_array is not None:
+                gsr_array, hr_array, n_valid = self._window_arrays(data_window)
+            else:
+                gsr_array, hr_array, n_valid = self._to_arrays(readings)
+            
+            if n_valid < self.min_samples:
+                logger.warning(f"Insufficient valid readings: {n_valid} (need at least {self.min_samples})")
                 
                 # If we have some valid readings but not enough, try to use them anyway
-                if len(valid_readings) > 0:
-                    logger.info(f"Using {len(valid_readings)} valid readings for feature extraction")
+                if n_valid > 0:
+                    logger.info(f"Using {n_valid} valid readings for feature extraction")
                 else:
                     logger.warning("No valid readings available - returning None")
                     return None
             
-            # Separate GSR and HR data
-            gsr_values = [r.gsr_conductance for r in valid_readings if r.gsr_conductance is not None]
-            hr_values = [r.heart_rate for r in valid_readings if r.heart_rate is not None]
-            
-            # Extract features
-            features = {}
+            # A channel without data keeps its default values of 0.0
+            values = np.zeros(NUM_FEATURES)
             
             # Extract HR features (7 features)
-            if hr_values:
-                features.update(self._extract_hr_features(hr_values))
-            else:
-                # Use default values if no HR data
-                features.update({feat: 0.0 for feat in self.hr_features})
+            if hr_array.size:
+                self._extract_hr_features(hr_array, values)
             
             # Extract EDA features (8 features) - GSR conductance is treated as EDA
-            if gsr_values:
-                features.update(self._extract_eda_features(gsr_values))
-            else:
-                # Use default values if no GSR data
-                features.update({feat: 0.0 for feat in self.eda_features})
+            if gsr_array.size:
+                self._extract_eda_features(gsr_array, values)
             
             # Log features if enabled
-            if self.config['log_features']:
-                self._log_features(features)
+            if self.log_features_enabled:
+                self._log_features(values)
             
-            logger.debug(f"Extracted {len(features)} features from {len(valid_readings)} readings")
-            return features
+            logger.debug(f"Extracted {NUM_FEATURES} features from {n_valid} readings")
+            self._last_sig = sig
+            self._last_values = values.copy()
+            return values
             
         except Exception as e:
             logger.error(f"Feature extraction failed: {e}")
             return None
 
-    def _extract_hr_features(self, hr_values: List[float]) -> Dict[str, float]:
-        """Extract HR features matching the training script exactly"""
-        hr_array = np.array(hr_values)
-        
-        features = {
-            'hr_mean': float(np.nanmean(hr_array)),
-            'hr_std': float(np.nanstd(hr_array, ddof=1)),
-            'hr_min': float(np.nanmin(hr_array)),
-            'hr_max': float(np.nanmax(hr_array)),
-            'hr_range': float(np.nanmax(hr_array) - np.nanmin(hr_array)),
-            'hr_skew': float(stats.skew(hr_array)),
-            'hr_kurtosis': float(stats.kurtosis(hr_array))
-        }
-        
-        return features
+    def _to_arrays(self, readings: List) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Split readings into (gsr, hr, n_valid) in a single pass.
+        Invalid readings and missing values are skipped; the arrays are float64.
+        """
+        gsr = []
+        hr = []
+        n_valid = 0
+        for r in readings:
+            if not r.valid:
+                continue
+            n_valid += 1
+            g = r.gsr_conductance
+            h = r.heart_rate
+            if g is not None:
+                gsr.append(g)
+            if h is not None:
+                hr.append(h)
+        return np.array(gsr, dtype=np.float64), np.array(hr, dtype=np.float64), n_valid
 
-    def _extract_eda_features(self, eda_values: List[float]) -> Dict[str, float]:
-        """Extract EDA features matching the training script exactly"""
-        eda_array = np.array(eda_values)
-        
-        features = {
-            'eda_mean': float(np.nanmean(eda_array)),
-            'eda_std': float(np.nanstd(eda_array, ddof=1)),
-            'eda_min': float(np.nanmin(eda_array)),
-            'eda_max': float(np.nanmax(eda_array)),
-            'eda_range': float(np.nanmax(eda_array) - np.nanmin(eda_array)),
-            'eda_skew': float(stats.skew(eda_array)),
-            'eda_kurtosis': float(stats.kurtosis(eda_array))
-        }
-        
-        # Calculate slope (linear fit over window) - matching training script
-        if len(eda_array) >= 2:
-            x = np.arange(len(eda_array)) / self.config['eda_fs']
-            a, b = np.polyfit(x, eda_array, 1)
-            features['eda_slope'] = float(a)  # μS per second
-        else:
-            features['eda_slope'] = 0.0
-        
-        return features
+    def _window_arrays(self, data_window) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Same as _to_arrays, from a DataWindow's gsr_array/hr_array.
+        Missing values are NaN there, and a reading is valid when it
+        has at least one value.
+        """
+        gsr = data_window.gsr_array
+        hr = data_window.hr_array
+        gsr_ok = ~np.isnan(gsr)
+        hr_ok = ~np.isnan(hr)
+        n_valid = int(np.count_nonzero(gsr_ok | hr_ok))
+        return gsr[gsr_ok].astype(np.float64), hr[hr_ok].astype(np.float64), n_valid
+
+    def _extract_hr_features(self, hr_array: np.ndarray, out: np.ndarray):
+        """Extract HR features matching the training script exactly into out"""
+        out[Feature.HR_MEAN:Feature.HR_KURTOSIS + 1] = _hr_kernel(hr_array)
+
+    def _extract_eda_features(self, eda_array: np.ndarray, out: np.ndarray):
+        """Extract EDA features matching the training script exactly into out"""
+        # Slope (linear fit over window, μS per second) uses the centred
+        # sample index, cached per window length
+        n = eda_array.size
+        cached = self._x_cache.get(n)
+        if cached is None:
+            cached = (np.arange(n) - (n - 1) / 2.0, n * (n * n - 1) / 12.0)
+            self._x_cache[n] = cached
+        x, sxx = cached
+        out[Feature.EDA_MEAN:Feature.EDA_SLOPE + 1] = _eda_kernel(eda_array, x, sxx, self.eda_fs)
 
-    def _log_features(self, features: Dict[str, float]):
+    def _log_features(self, values: np.ndarray):
         """Log extracted features to file"""
         try:
-            with open(self.config['log_file'], "a") as f:
-                timestamp_str = time.strftime("%Y-%m-%d %H:%M:%S")
-                feature_str = ",".join([f"{k}:{v:.3f}" for k, v in features.items()])
-                f.write(f"{timestamp_str},{feature_str}\n")
+            if self._log_fh is None:
+                self._log_fh = open(self.config['log_file'], "a", buffering=1 << 16)
+                atexit.register(self.close)
+            
+            # The timestamp only changes once a second
+            sec = int(time.time())
+            if sec != self._last_tsec:
+                self._last_tsec = sec
+                self._last_tstr = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+            
+            self._log_fh.write(self._last_tstr + "," + self._fmt % tuple(values.tolist()))
         except Exception as e:
             logger.warning(f"Failed to log features: {e}")
 
+    def close(self):
+        """Flush and close the feature log (also registered with atexit)"""
+        if self._log_fh is not None:
+            self._log_fh.close()
+            self._log_fh = None
+            atexit.unregister(self.close)
+
     def get_feature_names(self) -> List[str]:
         """Get the list of feature names expected by the model"""
         return self.all_features.copy()
 
-    def validate_features(self, features: Dict[str, float]) -> bool:
-        """Validate that all required features are present"""
-        return all(feat in features for feat in self.all_features)
+    def validate_features(self, features: Union[Dict[str, float], np.ndarray]) -> bool:
+        """Validate that all required features are present and finite"""
+        if isinstance(features, np.ndarray):
+            return features.shape == (NUM_FEATURES,) and bool(np.isfinite(features).all())
+        # A missing feature reads as NaN and so fails the finiteness check
+        values = np.fromiter((features.get(feat, np.nan) for feat in self.all_features),
+                             dtype=np.float64, count=NUM_FEATURES)
+        return bool(np.isfinite(values).all())
 
     def compute_baseline(self, calibration_data: List) -> Optional[Dict[str, Dict[str, float]]]:
         """
@@ -171,43 +394,36 @@ class FeatureExtractor:
                 logger.warning("No calibration data provided")
                 return None
             
-            valid_readings = [r for r in calibration_data if r.valid]
+            # Extract GSR and HR values
+            gsr_values, hr_values, n_valid = self._to_arrays(calibration_data)
             
-            if len(valid_readings) < 10:
-                logger.warning(f"Insufficient calibration data: {len(valid_readings)}")
+            if n_valid < 10:
+                logger.warning(f"Insufficient calibration data: {n_valid}")
                 return None
             
-            # Extract GSR and HR values
-            gsr_values = [r.gsr_conductance for r in valid_readings if r.gsr_conductance is not None]
-            hr_values = [r.heart_rate for r in valid_readings if r.heart_rate is not None]
-            
             baseline = {}
             
-            # Compute GSR baseline
-            if gsr_values:
-                baseline['gsr_conductance'] = {
-                    'mean': float(np.mean(gsr_values)),
-                    'std': float(np.std(gsr_values)),
-                    'min': float(np.min(gsr_values)),
-                    'max': float(np.max(gsr_values))
-                }
-            
-            # Compute HR baseline
-            if hr_values:
-                baseline['heart_rate'] = {
-                    'mean': float(np.mean(hr_values)),
-                    'std': float(np.std(hr_values)),
-                    'min': float(np.min(hr_values)),
-                    'max': float(np.max(hr_values))
-                }
-            
-            logger.info(f"Computed baseline from {len(valid_readings)} calibration readings")
+            # Compute GSR and HR baselines
+            if gsr_values.size:
+                baseline['gsr_conductance'] = self._baseline_stats(gsr_values)
+            if hr_values.size:
+                baseline['heart_rate'] = self._baseline_stats(hr_values)
+            
+            logger.info(f"Computed baseline from {n_valid} calibration readings")
             return baseline
             
         except Exception as e:
             logger.error(f"Baseline computation failed: {e}")
             return None
 
+    def _baseline_stats(self, values: np.ndarray) -> Dict[str, float]:
+        """Mean, population std, min and max of values from one fused reduction"""
+        n = values.size
+        mean, std, amin, amax = _basic_stats(values)
+        # _basic_stats gives the sample (ddof=1) std; the baseline uses ddof=0
+        std = std * np.sqrt((n - 1) / n) if n > 1 else 0.0
+        return {'mean': float(mean), 'std': float(std), 'min': float(amin), 'max': float(amax)}
+
 # Test function
 def test_feature_extractor():
     """Test the feature extractor with sample data"""
@@ -218,18 +434,18 @@ def test_feature_extractor():
     # Create sample data window
     from utils.data_collector import DataWindow, SensorReading
     
-    # Sample sensor readings
-    readings = []
-    for i in range(60):  # 60 seconds of data
-        reading = SensorReading(
-            gsr_conductance=10.0 + np.random.normal(0, 2),  # Simulate GSR
-            heart_rate=75.0 + np.random.normal(0, 5),      # Simulate HR
-            timestamp=time.time() + i,
-            valid=True
-        )
-        readings.append(reading)
+    # Sample sensor readings: 60 seconds of data, drawn in one go per signal
+    n = 60
+    gsr = (10.0 + np.random.normal(0, 2, size=n)).astype(np.float32)  # Simulate GSR
+    hr = (75.0 + np.random.normal(0, 5, size=n)).astype(np.float32)   # Simulate HR
+    ts = time.time() + np.arange(n)
+    readings = [
+        SensorReading(gsr_conductance=g, heart_rate=h, timestamp=t, valid=True)
+        for g, h, t in zip(gsr.tolist(), hr.tolist(), ts.tolist())
+    ]
     
-    data_window = DataWindow(readings=readings, baseline=None)
+    data_window = DataWindow(readings=readings, start_time=float(ts[0]), end_time=float(ts[-1]),
+                             duration=float(n), baseline=None, gsr_array=gsr, hr_array=hr)
     
     # Extract features
     features = extractor.extract_features(data_window)
@@ -241,9 +457,9 @@ def test_feature_extractor():
         
         # Validate features
         if extractor.validate_features(features):
-            print("All required features present")
+            print("All required features present and finite")
         else:
-            print("Missing required features")
+            print("Missing or non-finite features")
     else:
         print("Feature extraction failed")
 